@@ -1,6 +1,7 @@
 from app import app
 from flask import Flask, redirect, url_for, render_template, request, session, flash, request, abort
 import sqlite3
+from app.db import get_db
 import markdown
 import bleach
 import re
@@ -44,7 +45,7 @@ ALLOWED_ATTRIBUTES = {
 }
 
 def init_db():
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users_of_this_app (
@@ -104,7 +105,8 @@ def init_db():
 
         conn.commit()
 
-init_db()
+with app.app_context():
+    init_db()
 
 @app.route("/like", methods=["POST"])
 def like_note():
@@ -128,7 +130,7 @@ def like_note():
         return redirect(url_for("dashboard"))
 
     # Lookup user id
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id FROM users_of_this_app WHERE username = ?", (username,))
         row = cursor.fetchone()
@@ -140,7 +142,7 @@ def like_note():
 
     # Attempt to insert like; unique constraint prevents duplicates
     try:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO likes_of_this_app (user_id, note_id, ip_address)
@@ -212,7 +214,7 @@ def render():
             log_event("ERROR", "Someone_not_logged", None, ip_address)
             flash("Musisz być zalogowany, aby dodać notatkę.", "danger")
             return redirect(url_for("index"))
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                     SELECT id
@@ -228,7 +230,7 @@ def render():
                 time.sleep(delay-(start_time-time.time()))
             return redirect(url_for("index"))
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT password, private_key, iv, tag, salt FROM users_of_this_app WHERE username = ?", (username,))
             user_data = cursor.fetchone()
@@ -281,7 +283,7 @@ def render():
 
 def add_note_to_db(username, message, signature, ip_address):
     try:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO notes_of_this_app (message, author, signature, ip_address)
@@ -292,7 +294,7 @@ def add_note_to_db(username, message, signature, ip_address):
         raise
     
 def log_event(event_type, event_details=None, user_id=None, ip_address = None):
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO logs_of_this_app (event_type, event_details, user_id, ip_address)
@@ -330,7 +332,7 @@ def index():
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -441,7 +443,7 @@ def verify():
     time_window = 10 * 60
     max_failed_attempts = 3
 
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -620,7 +622,7 @@ def register():
             
 
         try:
-            with sqlite3.connect("users.db") as conn:
+            with get_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -684,7 +686,7 @@ def dashboard():
         username = session['user']
         notes = []
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             # include id so we can reference it in likes
             cursor.execute(
@@ -783,7 +785,7 @@ def user_page(user):
     user_ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
     if "user" in session:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -882,7 +884,7 @@ def change_password():
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -948,7 +950,7 @@ def change_password():
                     salt = os.urandom(16)
                     change_token = serializer.dumps(email, salt=salt)
                     print("Wysyłam taki token: "+ str(change_token)+" na taki adres "+str(email))
-                    with sqlite3.connect("users.db") as conn:
+                    with get_db() as conn:
                         cursor = conn.cursor()
                         cursor.execute("""
                             UPDATE users_of_this_app 
@@ -1031,7 +1033,7 @@ def change_verify():
     time_window = 10 * 60
     max_failed_attempts = 3
 
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -1127,7 +1129,7 @@ def change_verify():
 
                         hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256:300000', salt_length=16)
 
-                        with sqlite3.connect("users.db") as conn:
+                        with get_db() as conn:
                             cursor = conn.cursor()
                             cursor.execute("""
                                 UPDATE users_of_this_app 
@@ -1191,7 +1193,7 @@ def reset_password():
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -1255,7 +1257,7 @@ def reset_password():
                 salt = os.urandom(16)
                 change_token = serializer.dumps(email, salt=salt)
                 print("Wysyłam taki token: "+ str(change_token)+" na taki adres "+str(email)+" z takim linkiem: /reset_verify/"+str(change_token))
-                with sqlite3.connect("users.db") as conn:
+                with get_db() as conn:
                     cursor = conn.cursor()
                     cursor.execute("""
                             UPDATE users_of_this_app 
@@ -1334,7 +1336,7 @@ def reset_verify(change_token):
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -1424,7 +1426,7 @@ def reset_verify(change_token):
 
                         hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256:300000', salt_length=16)
 
-                        with sqlite3.connect("users.db") as conn:
+                        with get_db() as conn:
                             cursor = conn.cursor()
                             cursor.execute("""
                                 UPDATE users_of_this_app 
@@ -0,0 +1,52 @@
+"""Sprawdza, że po zalogowaniu kolejne wejście na /dashboard i /page/<autor> z ETagiem kończy się odpowiedzią 304.
+
+Komunikat flash z logowania musi zostać zużyty przy pierwszym renderowaniu, inaczej strona nigdy nie przychodzi
+z pamięci przeglądarki. Sprawdzany jest zwykły i strumieniowany /dashboard.
+
+Uruchomienie: python benchmarks/check_conditional.py
+"""
+import argparse
+import tempfile
+
+from common import fresh_code, load_app
+from load_test import PASSWORD, seed
+
+
+def check(client, path):
+    first = client.get(path)
+    etag = first.headers.get("ETag")
+    first.get_data()
+    second = client.get(path, headers={"If-None-Match": etag})
+    second.get_data()
+    print(f"{path}: {first.status_code} (ETag {etag}), potem {second.status_code}")
+    return first.status_code == 200 and etag and second.status_code == 304
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variant", default="claude", help="nazwa wariantu lub ścieżka do katalogu aplikacji")
+    args = parser.parse_args()
+
+    flask_app = load_app(args.variant, tempfile.mkdtemp(prefix="check_conditional_"))
+    flask_app.config["RESPONSE_PADDING_ENABLED"] = False
+    secrets = seed(flask_app, users=2, notes=5)
+
+    ok = True
+    # Kod TOTP nie może być użyty dwa razy, więc każde przejście loguje inne konto
+    for username, streaming in (("user0", False), ("user1", True)):
+        flask_app.config["DASHBOARD_STREAMING"] = streaming
+        client = flask_app.test_client()
+        response = client.post("/", data={
+            "username": username, "password": PASSWORD, "totp": fresh_code(secrets[username]),
+        })
+        if response.status_code != 302 or not response.location.endswith("/dashboard"):
+            raise SystemExit(f"Logowanie nie powiodło się: {response.status_code}")
+        print(f"strumieniowanie: {'tak' if streaming else 'nie'}")
+        ok &= bool(check(client, "/dashboard"))
+        ok &= bool(check(client, "/page/user0"))
+    if not ok:
+        raise SystemExit("Odpowiedź warunkowa nie zwróciła 304")
+
+
+if __name__ == "__main__":
+    main()
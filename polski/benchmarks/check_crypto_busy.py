@@ -0,0 +1,101 @@
+"""Sprawdza, że przy pełnej puli kryptograficznej nie pokazujemy notatek bez sprawdzonego podpisu.
+
+Zwykła tablica i strona autora odpowiadają 503 z Retry-After. Strumieniowana tablica odrzuca żądanie przed
+rozpoczęciem strumienia, a gdy pula zapełni się w trakcie, pomija niesprawdzone notatki, pokazuje komunikat
+i następne wejście z tym samym ETagiem nie dostaje 304.
+
+Uruchomienie: python benchmarks/check_crypto_busy.py
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+from common import load_app
+from load_test import seed
+
+NOTICE = "Serwer jest przeciążony: pominięto notatki"
+NOTE = '<div class="note-content">'
+
+
+class Saturate:
+    """Zajmuje wszystkie wątki puli kryptograficznej, dopóki blok with trwa"""
+
+    def __init__(self, flask_app):
+        from app.executor import crypto
+
+        self.crypto = crypto
+        self.workers = flask_app.config["CRYPTO_WORKERS"]
+        self.release = threading.Event()
+        self.threads = []
+
+    def __enter__(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.crypto.run, args=("hold", self.release.wait), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        while not self.crypto.busy():
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.release.set()
+        for thread in self.threads:
+            thread.join()
+
+
+def expect(label, condition):
+    print(f"{'OK ' if condition else 'BŁĄD'} {label}")
+    return bool(condition)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variant", default="claude", help="nazwa wariantu lub ścieżka do katalogu aplikacji")
+    args = parser.parse_args()
+
+    flask_app = load_app(args.variant, tempfile.mkdtemp(prefix="check_crypto_busy_"))
+    flask_app.config.update(RESPONSE_PADDING_ENABLED=False, CRYPTO_QUEUE_LIMIT=0, VERIFY_WORKERS=1,
+                            LEDGER_SWEEP_ENABLED=False)
+    seed(flask_app, users=2, notes=6)
+
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "user0"
+
+    ok = True
+    with Saturate(flask_app):
+        for path in ("/dashboard", "/page/user1"):
+            response = client.get(path)
+            ok &= expect(f"{path} przy pełnej puli: {response.status_code}, Retry-After "
+                         f"{response.headers.get('Retry-After')}",
+                         response.status_code == 503 and response.headers.get("Retry-After"))
+
+    flask_app.config.update(DASHBOARD_STREAMING=True, DASHBOARD_STREAM_CHUNK=1)
+    with Saturate(flask_app):
+        response = client.get("/dashboard")
+        ok &= expect(f"strumień przy pełnej puli: {response.status_code}", response.status_code == 503)
+
+    # Pula zapełnia się po pierwszej porcji strumienia
+    response = client.get("/dashboard", buffered=False)
+    chunks = iter(response.response)
+    body = ""
+    while "Notatka" not in body:
+        body += next(chunks).decode()
+    with Saturate(flask_app):
+        body += "".join(chunk.decode() for chunk in chunks)
+    response.close()
+    shown = body.count(NOTE)
+    ok &= expect(f"strumień zapełniony w trakcie: {response.status_code}, pokazano {shown} z 6 notatek, "
+                 f"komunikat: {NOTICE in body}", response.status_code == 200 and 0 < shown < 6 and NOTICE in body)
+
+    again = client.get("/dashboard", headers={"If-None-Match": response.headers["ETag"]})
+    body = again.get_data(as_text=True)
+    ok &= expect(f"następne wejście z ETagiem niepełnej strony: {again.status_code}, notatek {body.count(NOTE)}",
+                 again.status_code == 200 and NOTICE not in body)
+    if not ok:
+        raise SystemExit("Niesprawdzone notatki trafiły na stronę albo odpowiedź nie była 503")
+
+
+if __name__ == "__main__":
+    main()
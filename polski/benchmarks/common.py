@@ -0,0 +1,43 @@
+import os
+import sys
+import importlib
+import time
+
+import pyotp
+
+POLSKI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VARIANTS = {
+    "claude": os.path.join(POLSKI_DIR, "pol", "claude"),
+    "chat": os.path.join(POLSKI_DIR, "pol", "chat"),
+    "deepseek": os.path.join(POLSKI_DIR, "pol", "deepseek"),
+    "ang_chat": os.path.join(POLSKI_DIR, "ang", "chat"),
+}
+
+
+def load_app(variant, workdir):
+    """Importuje pakiet app wariantu tak, by users.db powstała w katalogu roboczym"""
+    variant_dir = VARIANTS.get(variant, variant)
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    for name in [m for m in sys.modules if m == "app" or m.startswith("app.")]:
+        del sys.modules[name]
+    sys.path.insert(0, os.path.abspath(variant_dir))
+    try:
+        module = importlib.import_module("app")
+        importlib.import_module("app.views")
+    finally:
+        sys.path.pop(0)
+    flask_app = module.app
+    flask_app.config["DATABASE"] = os.path.join(os.path.abspath(workdir), "users.db")
+    flask_app.config["WTF_CSRF_ENABLED"] = False
+    return flask_app
+
+
+def fresh_code(secret, margin=3):
+    """Kod TOTP, który przeżyje wolne logowanie (PBKDF2): gdy do końca 30-sekundowego okna zostało mniej niż
+    `margin` sekund, czeka na następne; wywoływać poza mierzonym czasem"""
+    totp = pyotp.TOTP(secret)
+    remaining = totp.interval - time.time() % totp.interval
+    if remaining < margin:
+        time.sleep(remaining)
+    return totp.now()
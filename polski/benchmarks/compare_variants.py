@@ -0,0 +1,261 @@
+"""Porównanie kosztu działania wariantów aplikacji (claude, chat, deepseek, ang_chat) na tych samych danych.
+
+Każdy wariant działa w osobnym procesie: najpierw jego init_db() tworzy schemat i wczytuje wspólne dane
+(te same konta, klucze, notatki i lajki), potem świeży proces importuje aplikację na gotowej bazie
+i odtwarza ten sam scenariusz przez klienta testowego. Dla każdej trasy mierzony jest czas odpowiedzi,
+liczba zapytań SQL (nagłówek X-DB-Queries), czas CPU procesu, a dla całego wariantu szczytowe RSS.
+Procesy potomne (np. pula generująca klucze w claude) trafiają do getrusage dopiero po ich zakończeniu.
+
+Opóźnienia wyrównujące czas odpowiedzi są wyłączane we wszystkich wariantach (RESPONSE_PADDING_ENABLED
+w claude, time.sleep w views.py pozostałych), bo inaczej porównanie mierzyłoby głównie sen; --padding je zostawia.
+
+Uruchomienie: python benchmarks/compare_variants.py --users 10 --notes-per-user 30 --rounds 20
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+
+import seed_db
+from common import VARIANTS, fresh_code, load_app
+
+PASSWORD = seed_db.PASSWORD
+SECRET_KEY = "compare-variants-secret"
+ROUTES = ("login", "dashboard", "page", "like", "render", "register")
+
+
+def build_seed(path, args):
+    """Wspólne dane z seed_db w formacie kont v1, który rozumieją wszystkie warianty"""
+    usernames, _, notes, likes, _ = seed_db.plan(
+        args.users, "poisson", args.notes_per_user, 1000, args.likes_density, 0, 30, args.seed, datetime(2025, 1, 1))
+    accounts = seed_db.build_accounts(usernames, notes, args.seed, SECRET_KEY, False, os.cpu_count() or 1)
+
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE seed_users (username TEXT, email TEXT, password TEXT, public_key BLOB, private_key BLOB, salt BLOB,
+            iv BLOB, tag BLOB, encrypted_totp_secret BLOB, totp_iv BLOB, totp_tag BLOB, topt_salt BLOB, totp_secret TEXT)
+    """)
+    conn.execute("CREATE TABLE seed_notes (message TEXT, created_at TEXT, author TEXT, signature BLOB, ip_address TEXT)")
+    conn.execute("CREATE TABLE seed_likes (user_id INTEGER, note_id INTEGER)")
+    conn.executemany("INSERT INTO seed_users VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+        tuple(account[column] for column in ("username", "email", "password", "public_key", "private_key", "salt", "iv",
+                                              "tag", "encrypted_totp_secret", "totp_iv", "totp_tag", "topt_salt",
+                                              "totp_secret"))
+        for account in accounts
+    ])
+    conn.executemany("INSERT INTO seed_notes VALUES (?, ?, ?, ?, '127.0.0.1')", [
+        (note["message"], note["created_at"].strftime("%Y-%m-%d %H:%M:%S"), usernames[note["author"]], note["signature"])
+        for note in notes
+    ])
+    conn.executemany("INSERT INTO seed_likes VALUES (?, ?)", [(user_id, note_id) for user_id, note_id, _ in likes])
+    conn.commit()
+    conn.close()
+
+
+def prepare(variant, workdir, seed_path):
+    """Tworzy schemat wariantu i kopiuje do niego wspólne dane"""
+    flask_app = load_app(variant, workdir)
+    conn = sqlite3.connect(flask_app.config["DATABASE"])
+    conn.execute("ATTACH DATABASE ? AS seed", (seed_path,))
+    conn.execute("""
+        INSERT INTO users_of_this_app (username, email, password, public_key, private_key, salt, iv, tag,
+            encrypted_totp_secret, totp_iv, totp_tag, topt_salt)
+        SELECT username, email, password, public_key, private_key, salt, iv, tag,
+            encrypted_totp_secret, totp_iv, totp_tag, topt_salt
+        FROM seed.seed_users ORDER BY rowid
+    """)
+    conn.execute("""
+        INSERT INTO notes_of_this_app (message, created_at, author, signature, ip_address)
+        SELECT message, created_at, author, signature, ip_address FROM seed.seed_notes ORDER BY rowid
+    """)
+    conn.execute("INSERT INTO likes_of_this_app (user_id, note_id) SELECT user_id, note_id FROM seed.seed_likes")
+    conn.commit()
+    conn.close()
+
+
+def like_request(variant, note_id):
+    """Warianty różnią się sposobem przekazania id notatki do /like"""
+    if variant == "chat":
+        return {"path": "/like", "json": {"note_id": note_id}}
+    if variant == "ang_chat":
+        return {"path": "/like", "data": {"note_id": note_id}}
+    return {"path": f"/like/{note_id}"}
+
+
+def run(variant, workdir, seed_path, args):
+    """Odtwarza scenariusz na przygotowanej bazie; zwraca pomiary dla każdej trasy"""
+    flask_app = load_app(variant, workdir)
+    flask_app.config["DB_STATS_HEADERS"] = True
+    flask_app.config["TESTING"] = True
+    if not args.padding:
+        flask_app.config["RESPONSE_PADDING_ENABLED"] = False
+        views = sys.modules["app.views"]
+        views.time = types.SimpleNamespace(**{**vars(time), "sleep": lambda seconds: None})
+
+    seed = sqlite3.connect(seed_path)
+    secrets = dict(seed.execute("SELECT username, totp_secret FROM seed_users"))
+    notes = seed.execute("SELECT COUNT(*) FROM seed_notes").fetchone()[0]
+    seed.close()
+
+    rng = random.Random(args.seed)
+    client = flask_app.test_client()
+    samples = {route: [] for route in ROUTES}
+
+    def call(route, method, path, record, **kwargs):
+        cpu = time.process_time()
+        start = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        latency = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        if response.status_code >= 500:
+            raise SystemExit(f"{variant}: {method} {path} -> {response.status_code}")
+        ok = route != "login" or response.headers.get("Location", "").endswith("/dashboard")
+        if record and ok:
+            samples[route].append({
+                "latency": latency,
+                "cpu": cpu,
+                "queries": int(response.headers.get("X-DB-Queries", 0)),
+            })
+        return ok
+
+    def login(username, record):
+        code = fresh_code(secrets[username])
+        if not call("login", "POST", "/", record, data={"username": username, "password": PASSWORD, "totp": code}):
+            raise SystemExit(f"{variant}: logowanie nie powiodło się")
+
+    for round_index in range(args.warmup + args.rounds):
+        record = round_index >= args.warmup
+        username = f"user{rng.randrange(args.users)}"
+        login(username, record)
+        call("dashboard", "GET", "/dashboard", record)
+        call("page", "GET", f"/page/user{rng.randrange(args.users)}", record)
+        like = like_request(variant, rng.randint(1, notes))
+        call("like", "POST", like.pop("path"), record, **like)
+        call("render", "POST", "/render", record, data={
+            "markdown": f"# Runda {round_index}\n\nTreść **testowa**.", "password": PASSWORD,
+        })
+        call("register", "POST", "/register", record, data={
+            "username": f"fresh{round_index}", "password": PASSWORD, "email": f"fresh{round_index}@example.com",
+        })
+
+    usage, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "routes": {route: summarize(rows) for route, rows in samples.items()},
+        "cpu_s": usage.ru_utime + usage.ru_stime,
+        "children_cpu_s": children.ru_utime + children.ru_stime,
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+        "children_peak_rss_mb": children.ru_maxrss / 1024,
+    }
+
+
+def summarize(rows):
+    latencies = sorted(row["latency"] for row in rows)
+    count = len(rows) or 1
+    return {
+        "requests": len(rows),
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0.0,
+        "cpu_ms": sum(row["cpu"] for row in rows) / count * 1000,
+        "queries": sum(row["queries"] for row in rows) / count,
+    }
+
+
+def child(args):
+    if args.child == "prepare":
+        prepare(args.variant, args.workdir, args.seed_db)
+        return
+    result = run(args.variant, args.workdir, args.seed_db, args)
+    with open(args.result, "w") as f:
+        json.dump(result, f)
+
+
+def spawn(stage, variant, workdir, seed_path, args, result=None):
+    command = [sys.executable, os.path.abspath(__file__), "--child", stage, "--variant", variant,
+               "--workdir", workdir, "--seed-db", seed_path, "--users", str(args.users),
+               "--rounds", str(args.rounds), "--warmup", str(args.warmup), "--seed", str(args.seed)]
+    if args.padding:
+        command.append("--padding")
+    if result:
+        command += ["--result", result]
+    completed = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               env=dict(os.environ, SECRET_KEY=SECRET_KEY), capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise SystemExit(f"{variant} ({stage}) zakończył się błędem:\n{completed.stderr[-4000:]}")
+
+
+def print_tables(results):
+    variants = list(results)
+    metrics = [("p50_ms", "p50 ms", "{:.1f}"), ("p95_ms", "p95 ms", "{:.1f}"),
+               ("cpu_ms", "CPU ms/żądanie", "{:.1f}"), ("queries", "zapytania SQL/żądanie", "{:.1f}")]
+    for key, title, fmt in metrics:
+        print(f"\n{title}")
+        print(f"{'trasa':>10} | " + " | ".join(f"{variant:>10}" for variant in variants))
+        for route in ROUTES:
+            print(f"{route:>10} | " + " | ".join(
+                f"{fmt.format(results[variant]['routes'][route][key]):>10}" for variant in variants))
+    print("\nproces")
+    print(f"{'':>10} | " + " | ".join(f"{variant:>10}" for variant in variants))
+    for key, title in [("cpu_s", "CPU s"), ("children_cpu_s", "CPU dzieci"), ("peak_rss_mb", "RSS MB"),
+                       ("children_peak_rss_mb", "RSS dzieci")]:
+        print(f"{title:>10} | " + " | ".join(f"{results[variant][key]:>10.1f}" for variant in variants))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--notes-per-user", type=float, default=30)
+    parser.add_argument("--likes-density", type=float, default=0.02, help="odsetek notatek polubionych przez konto")
+    parser.add_argument("--rounds", type=int, default=20, help="powtórzenia scenariusza objęte pomiarem")
+    parser.add_argument("--warmup", type=int, default=2, help="powtórzenia scenariusza przed pomiarem")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--padding", action="store_true", help="nie wyłączaj opóźnień wyrównujących")
+    parser.add_argument("--output", help="zapisz wynik JSON do pliku")
+    parser.add_argument("--json", action="store_true", help="wynik w formacie JSON")
+    parser.add_argument("--child", choices=["prepare", "run"], help=argparse.SUPPRESS)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--seed-db", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    root = tempfile.mkdtemp(prefix="compare_variants_")
+    seed_path = os.path.join(root, "seed.db")
+    build_seed(seed_path, args)
+
+    results = {}
+    for variant in args.variants:
+        workdir = os.path.join(root, variant)
+        result = os.path.join(root, f"{variant}.json")
+        spawn("prepare", variant, workdir, seed_path, args)
+        spawn("run", variant, workdir, seed_path, args, result)
+        with open(result) as f:
+            results[variant] = json.load(f)
+
+    report = {"config": {"users": args.users, "notes_per_user": args.notes_per_user, "likes_density": args.likes_density,
+                         "rounds": args.rounds, "warmup": args.warmup, "seed": args.seed, "padding": args.padding},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print_tables(results)
+
+
+if __name__ == "__main__":
+    main()
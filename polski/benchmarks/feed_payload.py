@@ -0,0 +1,107 @@
+"""Rozmiar odpowiedzi /dashboard i /page/<autor> przed i po usunięciu powtórzonych kluczy autorów, bez kompresji,
+z gzip i z brotli.
+
+Stan "przed" powstaje z tej samej strony: klucz PEM autora wraca do każdej notatki, a ukryte bloki z kluczami znikają,
+tak jak wyglądał szablon, zanim klucz był wysyłany raz na stronę. Obie wersje są kompresowane funkcją aplikacji.
+
+Uruchomienie: python benchmarks/feed_payload.py --notes 100 --authors 3
+"""
+import argparse
+import json
+import re
+import tempfile
+
+from common import load_app
+
+ENCODINGS = ("identity", "gzip", "br")
+KEY_BLOCK = re.compile(r'\n\s*<pre class="hidden" id="key-(\d+)">(.*?)</pre>', re.S)
+KEY_REFERENCE = re.compile(r'<span class="author-key" data-key="(\d+)"></span>')
+
+
+def seed(conn, notes_count, authors):
+    """Tworzy autorów z prawdziwymi kluczami i podpisane notatki, tak by strona przeszła weryfikację"""
+    from app.feed import encode_note
+    from app.keypool import generate_keypair
+    from app.ledger import sign_message
+    from cryptography.hazmat.primitives import serialization
+
+    keys = []
+    for i in range(authors):
+        private_pem, public_pem = generate_keypair()
+        keys.append(serialization.load_pem_private_key(private_pem, password=None))
+        conn.execute("""
+            INSERT INTO users_of_this_app (username, email, password, public_key, private_key, salt, iv, tag,
+                encrypted_totp_secret, totp_iv, totp_tag, topt_salt)
+            VALUES (?, ?, 'x', ?, x'', x'', x'', x'', x'', x'', x'', x'')
+        """, (f"user{i}", f"user{i}@example.com", public_pem))
+    for i in range(notes_count):
+        message = f"<p>Notatka numer {i} z odrobiną treści, żeby przypominała prawdziwy wpis.</p>"
+        signature = sign_message(keys[i % authors], message)
+        conn.execute("""
+            INSERT INTO notes_of_this_app (message, created_at, author, signature, ip_address, base_64, signature_b64)
+            VALUES (?, datetime('now', ? || ' seconds'), ?, ?, '127.0.0.1', ?, ?)
+        """, (message, f"-{notes_count - i}", f"user{i % authors}", signature, *encode_note(message, signature)))
+    conn.commit()
+
+
+def inline_keys(page):
+    """Strona z kluczem autora powtórzonym w każdej notatce, jak przed wysyłaniem go raz na stronę"""
+    keys = {key_id: pem for key_id, pem in KEY_BLOCK.findall(page)}
+    page = KEY_BLOCK.sub("", page)
+    return KEY_REFERENCE.sub(lambda match: keys[match[1]], page)
+
+
+def sizes(data, compress, encodings):
+    return {encoding: len(data) if encoding == "identity" else len(compress(encoding, data)) for encoding in encodings}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=100)
+    parser.add_argument("--authors", type=int, default=3)
+    parser.add_argument("--variant", default="claude", help="nazwa wariantu lub ścieżka do katalogu aplikacji")
+    parser.add_argument("--json", action="store_true", help="wynik w formacie JSON")
+    args = parser.parse_args()
+
+    flask_app = load_app(args.variant, tempfile.mkdtemp(prefix="feed_payload_"))
+    flask_app.config["RESPONSE_PADDING_ENABLED"] = False
+    flask_app.config["FEED_PAGE_SIZE"] = args.notes
+    from app.compression import _compress, brotli
+    from app.db import get_db
+
+    with flask_app.app_context():
+        seed(get_db(), args.notes, args.authors)
+
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "user0"
+
+    encodings = [encoding for encoding in ENCODINGS if encoding != "br" or brotli is not None]
+    results = {}
+    for name, path in [("dashboard", "/dashboard"), ("user_page", "/page/user0")]:
+        response = client.get(path)
+        assert response.status_code == 200, response.status_code
+        page = response.get_data(as_text=True)
+        baseline = inline_keys(page)
+        # Odtworzona strona musi zawierać każdy klucz tyle razy, ile jest notatek
+        assert baseline.count("BEGIN PUBLIC KEY") == page.count('class="author-key"'), name
+        results[name] = {
+            "before": sizes(baseline.encode(), _compress, encodings),
+            "after": sizes(page.encode(), _compress, encodings),
+        }
+
+    if args.json:
+        print(json.dumps({"notes": args.notes, "authors": args.authors, "results": results}, indent=2))
+        return
+    print(f"Notatek: {args.notes}, autorów: {args.authors}" + ("" if brotli else "; brotli niedostępne"))
+    print(f"{'strona':>10} | " + " | ".join(f"{encoding:>29}" for encoding in encodings))
+    for name, row in results.items():
+        cells = []
+        for encoding in encodings:
+            before, after = row["before"][encoding], row["after"][encoding]
+            cells.append(f"{before:>8} -> {after:>8} B ({(after - before) / before:>+4.0%})")
+        print(f"{name:>10} | " + " | ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Porównanie starej pętli N+1 z jednym zapytaniem fetch_feed dla strony /dashboard.
+
+Uruchomienie: python benchmarks/feed_queries.py --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import load_app
+
+USERS = 50
+VIEWER = "user0"
+
+
+def seed(conn, notes_count, likes_per_note=3):
+    """Wypełnia bazę użytkownikami, notatkami i lajkami bez kosztownej kryptografii"""
+    rng = random.Random(notes_count)
+    users = [
+        (f"user{i}", f"user{i}@example.com", "x", b"-----BEGIN PUBLIC KEY-----", b"", b"", b"", b"", b"", b"", b"", b"")
+        for i in range(USERS)
+    ]
+    conn.executemany("""
+        INSERT INTO users_of_this_app (username, email, password, public_key, private_key, salt, iv, tag,
+            encrypted_totp_secret, totp_iv, totp_tag, topt_salt)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, users)
+    conn.executemany("""
+        INSERT INTO notes_of_this_app (message, created_at, author, signature, ip_address)
+        VALUES (?, datetime('now', ? || ' seconds'), ?, ?, '127.0.0.1')
+    """, ((f"<p>notatka {i}</p>", f"-{notes_count - i}", f"user{rng.randrange(USERS)}", os.urandom(256))
+          for i in range(notes_count)))
+    conn.executemany("""
+        INSERT OR IGNORE INTO likes_of_this_app (note_id, user_id) VALUES (?, ?)
+    """, ((note_id, rng.randrange(1, USERS + 1))
+          for note_id in range(1, notes_count + 1) for _ in range(likes_per_note)))
+    conn.commit()
+
+
+def legacy_feed(conn, viewer):
+    """Odtworzenie dawnej pętli z dashboard(): 3 zapytania na notatkę"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM users_of_this_app WHERE username = ?", (viewer,))
+    viewer_id = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT message, created_at, signature, ip_address, author, id
+        FROM notes_of_this_app
+        ORDER BY created_at DESC
+    """)
+    notes = []
+    for message, created_at, signature, ip_address, author, note_id in cursor.fetchall():
+        cursor.execute("SELECT id, public_key FROM users_of_this_app WHERE username = ?", (author,))
+        author_id, public_key = cursor.fetchone()
+        cursor.execute("SELECT COUNT(*) FROM likes_of_this_app WHERE note_id = ?", (note_id,))
+        likes = cursor.fetchone()[0]
+        cursor.execute("SELECT id FROM likes_of_this_app WHERE note_id = ? AND user_id = ?", (note_id, viewer_id))
+        notes.append((note_id, author_id, public_key, likes, cursor.fetchone() is not None))
+    return notes
+
+
+def measure(flask_app, fn, repeat):
+    from app.db import db_stats, get_db
+
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with flask_app.app_context():
+            conn = get_db()
+            start = time.perf_counter()
+            fn(conn)
+            timings.append(time.perf_counter() - start)
+            queries = db_stats()["queries"]
+    return {"queries": queries, "best_ms": min(timings) * 1000, "mean_ms": sum(timings) / len(timings) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="wynik w formacie JSON")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix=f"feed_{size}_")
+        flask_app = load_app("claude", workdir)
+        from app.db import get_db
+        from app.feed import fetch_feed
+
+        with flask_app.app_context():
+            seed(get_db(), size)
+
+        legacy = measure(flask_app, lambda conn: legacy_feed(conn, VIEWER), args.repeat)
+        feed = measure(flask_app, lambda conn: fetch_feed(VIEWER), args.repeat)
+        results.append({"notes": size, "legacy": legacy, "feed": feed})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'notatki':>8} | {'N+1 zapytania':>13} {'N+1 ms':>10} | {'feed zapytania':>14} {'feed ms':>10}")
+    for row in results:
+        print(f"{row['notes']:>8} | {row['legacy']['queries']:>13} {row['legacy']['best_ms']:>10.1f} | "
+              f"{row['feed']['queries']:>14} {row['feed']['best_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""Test obciążeniowy tras aplikacji: przepustowość i p50/p95/p99 dla każdej trasy przy zadanej współbieżności.
+
+Aplikacja jest obciążana przez klienta testowego Flaska (bez sieci) oraz przez prawdziwy wielowątkowy serwer
+Werkzeug na losowym porcie. Wynik w JSON (--output) można porównać z wynikiem innego commita (--baseline).
+
+Uruchomienie: python benchmarks/load_test.py --users 20 --notes 1000 --concurrency 1 4 16 --duration 10 --no-padding
+"""
+import argparse
+import http.cookiejar
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from common import POLSKI_DIR, fresh_code, load_app
+
+PASSWORD = "Password1!"
+DEFAULT_MIX = "dashboard=50,page=20,like=15,render=8,login=5,register=2"
+
+
+def seed(flask_app, users, notes):
+    """Tworzy konta tak jak rejestracja (klucze v2, zaszyfrowany TOTP) i podpisane notatki; zwraca sekrety TOTP"""
+    from app.db import get_db
+    from app.feed import encode_note
+    from app.keypool import generate_keypair
+    from app.keys import KDF_VERSION, encrypt_totp_secret, new_password_keys
+    from app.ledger import sign_message
+    from app.keys import encrypt_data_gcm
+    from cryptography.hazmat.primitives import serialization
+    import pyotp
+
+    secrets, keys = {}, []
+    with flask_app.app_context():
+        with get_db() as conn:
+            for i in range(users):
+                username = f"user{i}"
+                private_pem, public_pem = generate_keypair()
+                keys.append(serialization.load_pem_private_key(private_pem, password=None))
+                record, salt, kek = new_password_keys(PASSWORD)
+                private_key, iv, tag = encrypt_data_gcm(private_pem, kek)
+                secrets[username] = pyotp.random_base32()
+                conn.execute("""
+                    INSERT INTO users_of_this_app (username, created_at, email, password, public_key, private_key, salt,
+                        iv, tag, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, kdf_version)
+                    VALUES (?, datetime('now'), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (username, f"{username}@example.com", record, public_pem, private_key, salt, iv, tag,
+                      *encrypt_totp_secret(secrets[username]), KDF_VERSION))
+            rows = []
+            for i in range(notes):
+                message = f"<p>Notatka {i} do testu obciążeniowego.</p>"
+                signature = sign_message(keys[i % users], message)
+                rows.append((message, f"-{notes - i}", f"user{i % users}", signature, *encode_note(message, signature)))
+            conn.executemany("""
+                INSERT INTO notes_of_this_app (message, created_at, author, signature, ip_address, base_64, signature_b64)
+                VALUES (?, datetime('now', ? || ' seconds'), ?, ?, '127.0.0.1', ?, ?)
+            """, rows)
+    return secrets
+
+
+def parse_mix(mix):
+    routes = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        if name not in ROUTES:
+            raise SystemExit(f"Nieznana trasa w --mix: {name} (dostępne: {', '.join(ROUTES)})")
+        routes[name] = float(weight)
+    return routes
+
+
+class TestClientSession:
+    """Sesja użytkownika obsługiwana przez klienta testowego Flaska"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ServerSession:
+    """Sesja użytkownika rozmawiająca z prawdziwym serwerem HTTP, z własnymi ciasteczkami"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body, method=method)) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def login(session, username, code):
+    return session.request("POST", "/", {"username": username, "password": PASSWORD, "totp": code})
+
+
+_registrations = itertools.count()
+
+
+def register(session):
+    username = f"load{os.getpid()}x{next(_registrations)}"
+    return session.request("POST", "/register", {
+        "username": username, "password": PASSWORD, "email": f"{username}@example.com",
+    })
+
+
+ROUTES = {
+    "dashboard": lambda s, ctx: s.request("GET", "/dashboard"),
+    "page": lambda s, ctx: s.request("GET", f"/page/user{ctx['rng'].randrange(ctx['users'])}"),
+    "like": lambda s, ctx: s.request("POST", f"/like/{ctx['rng'].randint(1, ctx['notes'])}"),
+    "render": lambda s, ctx: s.request("POST", "/render", {
+        "markdown": f"# Notatka {ctx['rng'].random()}\n\nTreść **testowa**.", "password": PASSWORD,
+    }),
+    "login": lambda s, ctx: login(s, ctx["username"], ctx["totp"]),
+    "register": lambda s, ctx: register(s),
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_level(make_session, secrets, args, mix, concurrency):
+    """Uruchamia `concurrency` wątków na --duration sekund; każdy jest zalogowanym użytkownikiem"""
+    names, weights = list(mix), list(mix.values())
+    samples = {name: [] for name in names}
+    statuses = {name: {} for name in names}
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker(index):
+        username = f"user{index % args.users}"
+        ctx = {"rng": random.Random(args.seed * 1000 + index), "users": args.users, "notes": args.notes,
+               "username": username, "secrets": secrets}
+        session = make_session()
+        login(session, username, fresh_code(secrets[username]))
+        local = []
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            name = ctx["rng"].choices(names, weights)[0]
+            # Oczekiwanie na kod z następnego okna TOTP nie wlicza się do czasu logowania
+            ctx["totp"] = fresh_code(secrets[username]) if name == "login" else None
+            start = time.perf_counter()
+            status = ROUTES[name](session, ctx)
+            local.append((name, time.perf_counter() - start, status))
+        with lock:
+            for name, latency, status in local:
+                samples[name].append(latency)
+                statuses[name][status] = statuses[name].get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    # Logowanie wątków nie wlicza się do pomiaru: zegar startuje, gdy wszystkie są gotowe
+    started = time.perf_counter()
+    deadline[0] = started + args.duration
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for name in names:
+        latencies = sorted(samples[name])
+        routes[name] = {
+            "requests": len(latencies),
+            "throughput_rps": len(latencies) / elapsed,
+            "errors": sum(count for status, count in statuses[name].items() if status >= 500),
+            "statuses": {str(status): count for status, count in sorted(statuses[name].items())},
+            **{f"p{q}_ms": (percentile(latencies, q) or 0.0) * 1000 for q in (50, 95, 99)},
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {"concurrency": concurrency, "elapsed_s": elapsed, "requests": total,
+            "throughput_rps": total / elapsed, "routes": routes}
+
+
+def start_server(flask_app):
+    from werkzeug.serving import make_server
+
+    # Dziennik każdego żądania zagłuszyłby raport i sam kosztuje czas
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=POLSKI_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline):
+    previous = {}
+    if baseline:
+        for mode in baseline["results"]:
+            for level in baseline["results"][mode]:
+                previous[(mode, level["concurrency"])] = level
+    for mode, levels in report["results"].items():
+        for level in levels:
+            print(f"\n[{mode}] współbieżność {level['concurrency']}: {level['requests']} żądań, "
+                  f"{level['throughput_rps']:.1f} żądań/s")
+            print(f"{'trasa':>10} | {'żądania':>7} | {'żąd./s':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | "
+                  f"{'5xx':>4} | {'p95 vs baza':>11}")
+            old = previous.get((mode, level["concurrency"]), {}).get("routes", {})
+            for name, route in level["routes"].items():
+                change = ""
+                if name in old and old[name]["p95_ms"]:
+                    change = f"{route['p95_ms'] / old[name]['p95_ms']:.2f}x"
+                print(f"{name:>10} | {route['requests']:>7} | {route['throughput_rps']:>7.1f} | {route['p50_ms']:>8.1f} | "
+                      f"{route['p95_ms']:>8.1f} | {route['p99_ms']:>8.1f} | {route['errors']:>4} | {change:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20, help="liczba kont w bazie")
+    parser.add_argument("--notes", type=int, default=1000, help="liczba notatek w bazie")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--duration", type=float, default=10.0, help="czas jednego poziomu współbieżności w sekundach")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="wagi tras, np. dashboard=50,like=50")
+    parser.add_argument("--mode", choices=["client", "server", "both"], default="both")
+    parser.add_argument("--no-padding", action="store_true", help="wyłącz wyrównywanie czasu odpowiedzi")
+    parser.add_argument("--variant", default="claude", help="nazwa wariantu lub ścieżka do katalogu aplikacji")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="zapisz wynik JSON do pliku")
+    parser.add_argument("--baseline", help="wynik JSON innego commita do porównania p95")
+    parser.add_argument("--json", action="store_true", help="wynik w formacie JSON")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    flask_app = load_app(args.variant, tempfile.mkdtemp(prefix="load_test_"))
+    flask_app.config["RESPONSE_PADDING_ENABLED"] = not args.no_padding
+    secrets = seed(flask_app, args.users, args.notes)
+
+    modes = ["client", "server"] if args.mode == "both" else [args.mode]
+    results = {}
+    for mode in modes:
+        server = None
+        if mode == "client":
+            make_session = lambda: TestClientSession(flask_app)
+        else:
+            server = start_server(flask_app)
+            base_url = f"http://127.0.0.1:{server.server_port}"
+            make_session = lambda: ServerSession(base_url)
+        try:
+            results[mode] = [run_level(make_session, secrets, args, mix, level) for level in args.concurrency]
+        finally:
+            if server is not None:
+                server.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "cpus": os.cpu_count(),
+        "config": {"users": args.users, "notes": args.notes, "duration_s": args.duration, "mix": mix,
+                   "padding": not args.no_padding, "variant": args.variant, "seed": args.seed},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
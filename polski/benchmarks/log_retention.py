@@ -0,0 +1,173 @@
+"""Archiwizacja dziennika: szybkość przenoszenia, opóźnienie bieżących zapisów w trakcie, rozmiar pliku i czas skanów.
+
+Dziennik z --logs wpisami rozłożonymi na --days dni jest przycinany do --retention-days. W tym czasie osobny wątek
+zapisuje zdarzenia tak jak żądania (queue_event z sync=True); jego opóźnienia porównujemy z pomiarem bez archiwizacji.
+
+Uruchomienie: python benchmarks/log_retention.py --logs 200000 --days 365 --retention-days 90
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from common import load_app
+from seed_db import LOG_EVENTS
+
+SCANS = {
+    "by_type": "SELECT event_type, COUNT(*) FROM logs_of_this_app GROUP BY event_type",
+    "details_like": "SELECT COUNT(*) FROM logs_of_this_app WHERE event_details LIKE '%liked%'",
+}
+
+
+def seed(conn, logs, days, seed):
+    rng = random.Random(seed)
+    names = [name for name, _, _ in LOG_EVENTS]
+    details = {name: detail for name, detail, _ in LOG_EVENTS}
+    weights = [weight for _, _, weight in LOG_EVENTS]
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(logs):
+        at = now - timedelta(seconds=days * 86400 * (logs - i) / logs)
+        event = rng.choices(names, weights)[0]
+        rows.append((event, details[event].format(note=rng.randint(1, 1000)), rng.randint(1, 100),
+                     at.strftime("%Y-%m-%d %H:%M:%S"), "127.0.0.1"))
+    conn.executemany("""
+        INSERT INTO logs_of_this_app (event_type, event_details, user_id, timestamp, ip_address)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+
+
+def file_size(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+
+def measure_scans(conn, repeat=3):
+    timings = {}
+    for name, sql in SCANS.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql).fetchall()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best * 1000
+    return timings
+
+
+class Writer(threading.Thread):
+    """Zapisuje zdarzenia dziennika jak obsługa żądań i zbiera czas każdego zapisu"""
+
+    def __init__(self, flask_app, queue_event):
+        super().__init__(daemon=True)
+        self.flask_app = flask_app
+        self.queue_event = queue_event
+        self.stop = threading.Event()
+        self.latencies = []
+
+    def run(self):
+        while not self.stop.is_set():
+            with self.flask_app.app_context():
+                start = time.perf_counter()
+                self.queue_event("NOTES_LOADED", "Notes_loaded", 1, "127.0.0.1", sync=True)
+                self.latencies.append(time.perf_counter() - start)
+            time.sleep(0.001)
+
+
+def summary(latencies):
+    values = sorted(latencies)
+    if not values:
+        return {"writes": 0}
+    pick = lambda q: values[min(len(values) - 1, int(q / 100 * len(values)))] * 1000
+    return {"writes": len(values), "p50_ms": pick(50), "p99_ms": pick(99), "max_ms": values[-1] * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=365, help="okres, na który rozkładają się wpisy")
+    parser.add_argument("--retention-days", type=int, default=90)
+    parser.add_argument("--batch", type=int, default=500, help="LOG_RETENTION_BATCH")
+    parser.add_argument("--pause", type=float, default=0.05, help="LOG_RETENTION_PAUSE w sekundach")
+    parser.add_argument("--variant", default="claude", help="nazwa wariantu lub ścieżka do katalogu aplikacji")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="wynik w formacie JSON")
+    args = parser.parse_args()
+
+    flask_app = load_app(args.variant, tempfile.mkdtemp(prefix="log_retention_"))
+    flask_app.config.update(RESPONSE_PADDING_ENABLED=False, LOG_RETENTION_ENABLED=False,
+                            LOG_RETENTION_DAYS=args.retention_days, LOG_RETENTION_BATCH=args.batch,
+                            LOG_RETENTION_PAUSE=args.pause)
+    from app.audit import queue_event
+    from app.db import get_db
+    from app.retention import archive_logs, archive_path, archived_partitions, retention_stats
+
+    database = flask_app.config["DATABASE"]
+    with flask_app.app_context():
+        conn = get_db()
+        seed(conn, args.logs, args.days, args.seed)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        before = {"rows": conn.execute("SELECT COUNT(*) FROM logs_of_this_app").fetchone()[0],
+                  "bytes": file_size(database), "scans_ms": measure_scans(conn)}
+
+    # Opóźnienie zapisów bez archiwizacji, jako punkt odniesienia
+    writer = Writer(flask_app, queue_event)
+    writer.start()
+    time.sleep(2)
+    writer.stop.set()
+    writer.join()
+    idle = summary(writer.latencies)
+
+    writer = Writer(flask_app, queue_event)
+    writer.start()
+    with flask_app.app_context():
+        start = time.perf_counter()
+        archived = archive_logs()
+        elapsed = time.perf_counter() - start
+    writer.stop.set()
+    writer.join()
+    during = summary(writer.latencies)
+
+    with flask_app.app_context():
+        conn = get_db()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        after = {"rows": conn.execute("SELECT COUNT(*) FROM logs_of_this_app").fetchone()[0],
+                 "bytes": file_size(database), "scans_ms": measure_scans(conn)}
+        partitions = archived_partitions()
+
+    report = {
+        "config": vars(args),
+        "archived": archived,
+        "elapsed_s": elapsed,
+        "rows_per_s": archived / elapsed if elapsed else 0.0,
+        "stats": retention_stats(),
+        "partitions": len(partitions),
+        "archive_bytes": file_size(archive_path()),
+        "before": before,
+        "after": after,
+        "writes_idle": idle,
+        "writes_during": during,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"Przeniesiono {archived} wpisów w {elapsed:.2f} s ({report['rows_per_s']:.0f}/s) "
+          f"do {len(partitions)} tabel miesięcznych; zwolniono stron: {report['stats']['vacuumed_pages']}")
+    print(f"{'':>18} | {'przed':>12} | {'po':>12}")
+    print(f"{'wpisy':>18} | {before['rows']:>12} | {after['rows']:>12}")
+    print(f"{'rozmiar bazy B':>18} | {before['bytes']:>12} | {after['bytes']:>12}")
+    for name in SCANS:
+        print(f"{name + ' ms':>18} | {before['scans_ms'][name]:>12.2f} | {after['scans_ms'][name]:>12.2f}")
+    print(f"archiwum: {report['archive_bytes']} B")
+    for label, stats in (("zapisy bez archiwizacji", idle), ("zapisy w trakcie", during)):
+        if stats["writes"]:
+            print(f"{label}: {stats['writes']}, p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms, "
+                  f"max {stats['max_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Koszt CPU wyprowadzania kluczy przy logowaniu, dodaniu notatki i rejestracji: konta w wersji 1 i 2.
+
+Uruchomienie: python benchmarks/login_crypto.py --repeat 5
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common import load_app
+
+PASSWORD = "Password1!"
+
+
+def cpu_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        timings.append(time.process_time() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="wynik w formacie JSON")
+    args = parser.parse_args()
+
+    load_app("claude", tempfile.mkdtemp(prefix="login_crypto_"))
+    from app import app
+    from app.keys import (KDF_VERSION, LEGACY_ITERATIONS, check_password, derive_user_keys, encrypt_totp_secret,
+                          new_password_keys, private_key_kek, totp_key, _pbkdf2)
+    from werkzeug.security import generate_password_hash
+
+    salt, topt_salt = os.urandom(16), os.urandom(16)
+    legacy_record = generate_password_hash(PASSWORD, method='pbkdf2:sha256:300000', salt_length=16)
+    record, _ = derive_user_keys(PASSWORD, salt)
+
+    def legacy_login():
+        check_password(legacy_record, 1, salt, PASSWORD)
+        totp_key(1, topt_salt)
+
+    def login():
+        check_password(record, KDF_VERSION, salt, PASSWORD)
+        totp_key(KDF_VERSION, topt_salt)
+
+    def legacy_note():
+        _, kek = check_password(legacy_record, 1, salt, PASSWORD)
+        private_key_kek(1, kek, PASSWORD, salt)
+
+    def note():
+        _, kek = check_password(record, KDF_VERSION, salt, PASSWORD)
+        private_key_kek(KDF_VERSION, kek, PASSWORD, salt)
+
+    def legacy_register():
+        generate_password_hash(PASSWORD, method='pbkdf2:sha256:300000', salt_length=16)
+        _pbkdf2(PASSWORD + app.config["SECRET_KEY"], salt, LEGACY_ITERATIONS)
+        _pbkdf2(app.config["SECRET_KEY"], topt_salt, LEGACY_ITERATIONS)
+
+    def register():
+        new_password_keys(PASSWORD)
+        encrypt_totp_secret("JBSWY3DPEHPK3PXP")
+
+    results = {}
+    for name, legacy, current in [("login", legacy_login, login), ("note", legacy_note, note),
+                                  ("register", legacy_register, register)]:
+        before, after = cpu_time(legacy, args.repeat), cpu_time(current, args.repeat)
+        results[name] = {"v1_cpu_ms": before, "v2_cpu_ms": after, "ratio": after / before}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'operacja':>10} | {'v1 CPU ms':>10} | {'v2 CPU ms':>10} | {'v2/v1':>6}")
+    for name, row in results.items():
+        print(f"{name:>10} | {row['v1_cpu_ms']:>10.1f} | {row['v2_cpu_ms']:>10.1f} | {row['ratio']:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
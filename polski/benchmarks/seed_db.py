@@ -0,0 +1,342 @@
+"""Generator syntetycznej bazy users.db w schemacie init_db() wybranego wariantu.
+
+Konta mają prawdziwe klucze RSA, zaszyfrowany klucz prywatny i sekret TOTP w formacie kont v1 (rozumianym przez
+wszystkie warianty), notatki są podpisane RSA-PSS, są też lajki i historia dziennika. Klucze, podpisy i KDF
+liczone są w puli procesów, a wiersze trafiają do bazy przez executemany w dużych transakcjach.
+
+Wynik zależy wyłącznie od --seed: klucze RSA, sole, IV i sole PSS pochodzą z generatora losowego z ziarnem,
+więc baza nadaje się do benchmarków, ale nie do czegokolwiek, co wymaga prawdziwej losowości.
+
+Uruchomienie: python benchmarks/seed_db.py --output /tmp/baza --users 1000 --notes-per-user 5 --notes-dist zipf
+"""
+import argparse
+import base64
+import functools
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import sqlite3
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from common import load_app
+
+PASSWORD = "Password1!"
+PASSWORD_METHOD = "pbkdf2:sha256:300000"
+LEGACY_ITERATIONS = 100000
+KEY_BITS = 2048
+SALT_CHARS = string.ascii_letters + string.digits
+SIEVE_LIMIT = 50000
+WORDS = ("notatka", "dzisiaj", "projekt", "kod", "spotkanie", "pomysł", "lista", "zadanie", "test", "wynik",
+         "serwer", "baza", "klucz", "podpis", "strona", "tydzień", "plan", "uwaga", "szybko", "dobrze")
+# Zdarzenia, które aplikacja zapisuje w logs_of_this_app, z przybliżonymi proporcjami
+LOG_EVENTS = (("NOTES_LOADED", "Notes_loaded", 60), ("LOGGED_IN", "User_logged_in", 15),
+              ("LIKE", "Note_{note}_liked", 15), ("UNLIKE", "Note_{note}_unliked", 4),
+              ("LOGIN_ERROR", "Wrong_login_data", 5), ("REGISTRATION_SUCCESS", "Registration_success", 1))
+
+
+def _primorial(limit):
+    sieve = bytearray([1]) * limit
+    sieve[:2] = b"\0\0"
+    for i in range(2, int(limit ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return math.prod(i for i in range(3, limit) if sieve[i])
+
+
+# Iloczyn nieparzystych liczb pierwszych poniżej SIEVE_LIMIT: jedno gcd odrzuca ~90% kandydatów bez potęgowania
+SMALL_PRIMORIAL = _primorial(SIEVE_LIMIT)
+
+
+def _is_probable_prime(n, rng, rounds=5):
+    # Dla losowych liczb 1024-bitowych 5 rund Millera-Rabina wystarcza (FIPS 186-4, tabela C.2)
+    if math.gcd(n, SMALL_PRIMORIAL) != 1:
+        return False
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d, r = d // 2, r + 1
+    for _ in range(rounds):
+        x = pow(rng.randrange(2, n - 1), d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _random_prime(rng, bits, e):
+    while True:
+        # Dwa najstarsze bity ustawione, żeby iloczyn dwóch liczb pierwszych miał dokładnie 2 * bits bitów
+        candidate = rng.getrandbits(bits) | (3 << (bits - 2)) | 1
+        if math.gcd(e, candidate - 1) == 1 and _is_probable_prime(candidate, rng):
+            return candidate
+
+
+def rsa_key(rng):
+    """Para kluczy RSA-2048 wyznaczona przez generator z ziarnem"""
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    e = 65537
+    p = _random_prime(rng, KEY_BITS // 2, e)
+    q = _random_prime(rng, KEY_BITS // 2, e)
+    while q == p:
+        q = _random_prime(rng, KEY_BITS // 2, e)
+    d = pow(e, -1, (p - 1) * (q - 1) // math.gcd(p - 1, q - 1))
+    return rsa.RSAPrivateNumbers(
+        p, q, d, rsa.rsa_crt_dmp1(d, p), rsa.rsa_crt_dmq1(d, q), rsa.rsa_crt_iqmp(p, q),
+        rsa.RSAPublicNumbers(e, p * q)
+    ).private_key(unsafe_skip_rsa_key_validation=True)
+
+
+def _mgf1(seed, length):
+    mask = b""
+    for counter in range((length + 31) // 32):
+        mask += hashlib.sha256(seed + counter.to_bytes(4, "big")).digest()
+    return mask[:length]
+
+
+def pss_sign(numbers, message, rng):
+    """Podpis RSA-PSS (SHA-256, MGF1, maksymalna sól) jak w aplikacji, ale z solą z generatora z ziarnem"""
+    n = numbers.public_numbers.n
+    em_bits = n.bit_length() - 1
+    em_len = (em_bits + 7) // 8
+    salt = rng.randbytes(em_len - 32 - 2)
+    h = hashlib.sha256(b"\0" * 8 + hashlib.sha256(message.encode()).digest() + salt).digest()
+    db = b"\0" * (em_len - len(salt) - 32 - 2) + b"\x01" + salt
+    masked = bytearray(a ^ b for a, b in zip(db, _mgf1(h, len(db))))
+    masked[0] &= 0xFF >> (8 * em_len - em_bits)
+    m = int.from_bytes(bytes(masked) + h + b"\xbc", "big")
+    # Podpis z twierdzenia chińskiego o resztach, kilka razy szybszy niż pow(m, d, n)
+    s1, s2 = pow(m, numbers.dmp1, numbers.p), pow(m, numbers.dmq1, numbers.q)
+    s = s2 + numbers.q * ((numbers.iqmp * (s1 - s2)) % numbers.p)
+    return s.to_bytes((n.bit_length() + 7) // 8, "big")
+
+
+@functools.lru_cache(maxsize=16)
+def _pbkdf2(secret, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", secret.encode(), salt, iterations)
+
+
+def _encrypt(data, key, rng):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    iv = rng.randbytes(12)
+    sealed = AESGCM(key).encrypt(iv, data, None)
+    return sealed[:-16], iv, sealed[-16:]
+
+
+def build_account(task):
+    """Konto v1 (jak z /register sprzed KDF v2) i podpisy jego notatek; wykonywane w procesie roboczym"""
+    from cryptography.hazmat.primitives import serialization
+
+    username, seed, secret_key, shared_kdf, messages = task
+    rng = random.Random(f"{seed}:{username}")
+    kdf_rng = random.Random(f"{seed}:kdf") if shared_kdf else rng
+    private_key = rsa_key(rng)
+    password_salt = "".join(kdf_rng.choice(SALT_CHARS) for _ in range(16))
+    salt, topt_salt = kdf_rng.randbytes(16), kdf_rng.randbytes(16)
+    totp_secret = base64.b32encode(rng.randbytes(20)).decode()
+    private_pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                            serialization.NoEncryption())
+    encrypted_private_key, iv, tag = _encrypt(private_pem, _pbkdf2(PASSWORD + secret_key, salt, LEGACY_ITERATIONS), rng)
+    encrypted_totp_secret, totp_iv, totp_tag = _encrypt(totp_secret.encode(),
+                                                        _pbkdf2(secret_key, topt_salt, LEGACY_ITERATIONS), rng)
+    iterations = int(PASSWORD_METHOD.rsplit(":", 1)[1])
+    password = f"{PASSWORD_METHOD}${password_salt}${_pbkdf2(PASSWORD, password_salt.encode(), iterations).hex()}"
+    numbers = private_key.private_numbers()
+    return {
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password,
+        "public_key": private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                            serialization.PublicFormat.SubjectPublicKeyInfo),
+        "private_key": encrypted_private_key, "salt": salt, "iv": iv, "tag": tag,
+        "encrypted_totp_secret": encrypted_totp_secret, "totp_iv": totp_iv, "totp_tag": totp_tag,
+        "topt_salt": topt_salt,
+        "totp_secret": totp_secret,
+        "signatures": [pss_sign(numbers, message, rng) for message in messages],
+    }
+
+
+def _notes_count(rng, dist, mean, max_notes):
+    if dist == "fixed":
+        count = round(mean)
+    elif dist == "poisson":
+        # Metoda Knutha; przy dużej średniej przybliżenie rozkładem normalnym
+        if mean > 30:
+            count = round(rng.gauss(mean, math.sqrt(mean)))
+        else:
+            limit, count, product = math.exp(-mean), 0, rng.random()
+            while product > limit:
+                count, product = count + 1, product * rng.random()
+    else:
+        # Rozkład Pareto z alfa 1.5 przeskalowany do zadanej średniej: większość pisze mało, nieliczni bardzo dużo
+        alpha = 1.5
+        count = round(rng.paretovariate(alpha) * mean * (alpha - 1) / alpha)
+    return max(0, min(count, max_notes))
+
+
+def _message(rng, index):
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+    if rng.random() < 0.3:
+        return f"<h2>Notatka {index}</h2>\n<p>{words}</p>"
+    return f"<p>{words}</p>"
+
+
+def plan(users, notes_dist, notes_per_user, max_notes, likes_density, logs_per_user, days, seed, epoch):
+    """Wszystko poza kryptografią: liczby notatek, treści, daty, lajki i dziennik; zależy tylko od ziarna"""
+    rng = random.Random(seed)
+    span = days * 86400
+    usernames = [f"user{i}" for i in range(users)]
+    created = [epoch + timedelta(seconds=rng.randrange(span)) for _ in usernames]
+    notes = []
+    for author, (username, joined) in enumerate(zip(usernames, created)):
+        for _ in range(_notes_count(rng, notes_dist, notes_per_user, max_notes)):
+            age = (epoch + timedelta(seconds=span) - joined).total_seconds()
+            notes.append((joined + timedelta(seconds=rng.random() * age), author))
+    # Identyfikatory notatek rosną z czasem, tak jak przy normalnym użyciu aplikacji
+    notes.sort()
+    notes = [{"author": author, "created_at": at, "message": _message(rng, i)} for i, (at, author) in enumerate(notes)]
+
+    likes = []
+    if notes:
+        expected = likes_density * len(notes)
+        for user_id in range(1, users + 1):
+            count = max(0, min(len(notes), round(rng.gauss(expected, math.sqrt(expected)))))
+            for note_id in sorted(rng.sample(range(1, len(notes) + 1), count)):
+                at = notes[note_id - 1]["created_at"]
+                age = (epoch + timedelta(seconds=span) - at).total_seconds()
+                likes.append((user_id, note_id, at + timedelta(seconds=rng.random() * age)))
+
+    names, details, weights = zip(*LOG_EVENTS)
+    logs = []
+    for user_id in range(1, users + 1):
+        for _ in range(logs_per_user):
+            event = rng.choices(range(len(names)), weights)[0]
+            at = epoch + timedelta(seconds=rng.randrange(span))
+            logs.append((at, names[event], details[event].format(note=rng.randint(1, max(1, len(notes)))), user_id,
+                         f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"))
+    logs.sort()
+    return usernames, created, notes, likes, logs
+
+
+def build_accounts(usernames, notes, seed, secret_key, shared_kdf, workers):
+    """Generuje konta i podpisy w puli procesów; kolejność wyniku odpowiada kolejności usernames"""
+    messages = [[] for _ in usernames]
+    for note in notes:
+        messages[note["author"]].append(note["message"])
+    tasks = [(username, seed, secret_key, shared_kdf, messages[i]) for i, username in enumerate(usernames)]
+    # spawn: proces główny ma już zaimportowaną aplikację z jej wątkami w tle
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        accounts = list(pool.map(build_account, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    cursors = [0] * len(usernames)
+    for note in notes:
+        note["signature"] = accounts[note["author"]]["signatures"][cursors[note["author"]]]
+        cursors[note["author"]] += 1
+    return accounts
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _insert(conn, table, columns, rows, batch):
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for start in range(0, len(rows), batch):
+        with conn:
+            conn.executemany(sql, rows[start:start + batch])
+
+
+def write(path, usernames, created, accounts, notes, likes, logs, batch):
+    """Wstawia dane do gotowego schematu; kolumny dodane w późniejszych wersjach są wypełniane, jeśli istnieją"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous = OFF")
+    user_columns = ["username", "created_at", "email", "password", "public_key", "private_key", "salt", "iv", "tag",
+                    "encrypted_totp_secret", "totp_iv", "totp_tag", "topt_salt"]
+    _insert(conn, "users_of_this_app", user_columns, [
+        (account["username"], joined.strftime("%Y-%m-%d %H:%M:%S"), *(account[c] for c in user_columns[2:]))
+        for account, joined in zip(accounts, created)
+    ], batch)
+
+    note_columns = ["message", "created_at", "author", "signature", "ip_address"]
+    encoded = {"base_64", "signature_b64"} <= _columns(conn, "notes_of_this_app")
+    if encoded:
+        note_columns += ["base_64", "signature_b64"]
+    rows = []
+    for note in notes:
+        row = (note["message"], note["created_at"].strftime("%Y-%m-%d %H:%M:%S"), usernames[note["author"]],
+               note["signature"], "127.0.0.1")
+        if encoded:
+            row += (base64.b64encode(note["message"].encode("utf-8")).decode("utf-8"),
+                    base64.b64encode(note["signature"]).decode("utf-8"))
+        rows.append(row)
+    _insert(conn, "notes_of_this_app", note_columns, rows, batch)
+    _insert(conn, "likes_of_this_app", ["user_id", "note_id", "created_at"],
+            [(user_id, note_id, at.strftime("%Y-%m-%d %H:%M:%S")) for user_id, note_id, at in likes], batch)
+    _insert(conn, "logs_of_this_app", ["timestamp", "event_type", "event_details", "user_id", "ip_address"],
+            [(at.strftime("%Y-%m-%d %H:%M:%S"), *rest) for at, *rest in logs], batch)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", required=True, help="katalog, w którym powstanie users.db")
+    parser.add_argument("--variant", default="claude", help="wariant, którego init_db() tworzy schemat")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--notes-per-user", type=float, default=5, help="średnia liczba notatek na konto")
+    parser.add_argument("--notes-dist", choices=["fixed", "poisson", "zipf"], default="poisson")
+    parser.add_argument("--max-notes", type=int, default=1000, help="górny limit notatek jednego konta")
+    parser.add_argument("--likes-density", type=float, default=0.01, help="odsetek notatek polubionych przez konto")
+    parser.add_argument("--logs-per-user", type=int, default=50)
+    parser.add_argument("--days", type=int, default=365, help="okres, z którego pochodzą daty")
+    parser.add_argument("--epoch", default="2025-01-01", help="początek okresu (RRRR-MM-DD)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch", type=int, default=10000, help="wierszy na transakcję")
+    parser.add_argument("--shared-kdf", action="store_true",
+                        help="wspólne sole wszystkich kont: PBKDF2 liczone raz, a nie trzy razy na konto")
+    parser.add_argument("--secrets", help="zapisz sekrety TOTP kont do pliku JSON (do logowania w testach)")
+    args = parser.parse_args()
+
+    timings = {}
+    start = time.perf_counter()
+    flask_app = load_app(args.variant, args.output)
+    path = flask_app.config["DATABASE"]
+    with sqlite3.connect(path) as conn:
+        if conn.execute("SELECT COUNT(*) FROM users_of_this_app").fetchone()[0]:
+            raise SystemExit(f"{path} zawiera już konta; podaj pusty katalog")
+    timings["schema"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    usernames, created, notes, likes, logs = plan(
+        args.users, args.notes_dist, args.notes_per_user, args.max_notes, args.likes_density, args.logs_per_user,
+        args.days, args.seed, datetime.strptime(args.epoch, "%Y-%m-%d"))
+    timings["plan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    accounts = build_accounts(usernames, notes, args.seed, flask_app.config["SECRET_KEY"], args.shared_kdf,
+                              args.workers)
+    timings["crypto"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    write(path, usernames, created, accounts, notes, likes, logs, args.batch)
+    timings["insert"] = time.perf_counter() - start
+
+    if args.secrets:
+        with open(args.secrets, "w") as f:
+            json.dump({"password": PASSWORD, "totp": {a["username"]: a["totp_secret"] for a in accounts}}, f, indent=2)
+    print(f"{path}: kont {len(accounts)}, notatek {len(notes)}, lajków {len(likes)}, wpisów dziennika {len(logs)}")
+    print(", ".join(f"{phase} {seconds:.1f} s" for phase, seconds in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
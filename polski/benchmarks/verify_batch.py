@@ -0,0 +1,68 @@
+"""Czas weryfikacji podpisów jednej strony tablicy w zależności od VERIFY_WORKERS.
+
+Uruchomienie: python benchmarks/verify_batch.py --notes 20 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common import load_app
+
+
+def wall_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=20, help="notatek na stronie")
+    parser.add_argument("--authors", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="wynik w formacie JSON")
+    args = parser.parse_args()
+
+    flask_app = load_app("claude", tempfile.mkdtemp(prefix="verify_batch_"))
+    # Pula kryptograficzna powstaje przy pierwszym użyciu, więc musi od razu mieć tyle wątków, ile największy wariant
+    flask_app.config["CRYPTO_WORKERS"] = max(args.workers)
+    from app.keypool import generate_keypair
+    from app.ledger import sign_message, verify_batch, verify_signature
+    from cryptography.hazmat.primitives import serialization
+
+    keys = [serialization.load_pem_private_key(generate_keypair()[0], password=None) for _ in range(args.authors)]
+    items = []
+    for i in range(args.notes):
+        private_key = keys[i % len(keys)]
+        message = f"<p>Notatka {i}</p>"
+        items.append((private_key.public_key(), message, sign_message(private_key, message)))
+
+    def sequential():
+        for public_key, message, signature in items:
+            verify_signature(public_key, message, signature)
+
+    baseline = wall_time(sequential, args.repeat)
+    results = {"sequential": {"page_ms": baseline, "speedup": 1.0}}
+    for workers in sorted(set(args.workers)):
+        flask_app.config["VERIFY_WORKERS"] = workers
+        assert all(verify_batch(items))
+        page_ms = wall_time(lambda: verify_batch(items), args.repeat)
+        results[f"workers={workers}"] = {"page_ms": page_ms, "speedup": baseline / page_ms}
+
+    if args.json:
+        print(json.dumps({"cpus": os.cpu_count(), "notes": args.notes, "results": results}, indent=2))
+        return
+    print(f"Procesory: {os.cpu_count()}, notatek na stronie: {args.notes}")
+    print(f"{'wariant':>12} | {'strona ms':>10} | {'przyspieszenie':>14}")
+    for name, row in results.items():
+        print(f"{name:>12} | {row['page_ms']:>10.2f} | {row['speedup']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
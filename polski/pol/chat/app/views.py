@@ -1,6 +1,7 @@
 from app import app
 from flask import Flask, redirect, url_for, render_template, request, session, flash, request, abort
 import sqlite3
+from app.db import get_db
 import markdown
 import bleach
 import re
@@ -43,7 +44,7 @@ ALLOWED_ATTRIBUTES = {
 }
 
 def init_db():
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users_of_this_app (
@@ -100,7 +101,8 @@ def init_db():
         ''')
         conn.commit()
 
-init_db()
+with app.app_context():
+    init_db()
 
 @app.route("/like", methods=["POST"])
 def like_note():
@@ -117,7 +119,7 @@ def like_note():
     username = session["user"]
     user_ip = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         # pobierz id użytkownika
         cursor.execute("SELECT id FROM users_of_this_app WHERE username = ?", (username,))
@@ -216,7 +218,7 @@ def render():
             log_event("ERROR", "Someone_not_logged", None, ip_address)
             flash("Musisz być zalogowany, aby dodać notatkę.", "danger")
             return redirect(url_for("index"))
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                     SELECT id
@@ -232,7 +234,7 @@ def render():
                 time.sleep(delay-(start_time-time.time()))
             return redirect(url_for("index"))
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT password, private_key, iv, tag, salt FROM users_of_this_app WHERE username = ?", (username,))
             user_data = cursor.fetchone()
@@ -285,7 +287,7 @@ def render():
 
 def add_note_to_db(username, message, signature, ip_address):
     try:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO notes_of_this_app (message, author, signature, ip_address)
@@ -296,7 +298,7 @@ def add_note_to_db(username, message, signature, ip_address):
         raise
     
 def log_event(event_type, event_details=None, user_id=None, ip_address = None):
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO logs_of_this_app (event_type, event_details, user_id, ip_address)
@@ -334,7 +336,7 @@ def index():
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -445,7 +447,7 @@ def verify():
     time_window = 10 * 60
     max_failed_attempts = 3
 
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -624,7 +626,7 @@ def register():
             
 
         try:
-            with sqlite3.connect("users.db") as conn:
+            with get_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -693,7 +695,7 @@ def dashboard():
     username = session['user']
     notes = []
 
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
 
         # pobierz id aktualnego użytkownika (przyda się do sprawdzania, czy polubił)
@@ -788,7 +790,7 @@ def user_page(user):
     user_ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
     if "user" in session:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -887,7 +889,7 @@ def change_password():
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -953,7 +955,7 @@ def change_password():
                     salt = os.urandom(16)
                     change_token = serializer.dumps(email, salt=salt)
                     print("Wysyłam taki token: "+ str(change_token)+" na taki adres "+str(email))
-                    with sqlite3.connect("users.db") as conn:
+                    with get_db() as conn:
                         cursor = conn.cursor()
                         cursor.execute("""
                             UPDATE users_of_this_app 
@@ -1036,7 +1038,7 @@ def change_verify():
     time_window = 10 * 60
     max_failed_attempts = 3
 
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -1132,7 +1134,7 @@ def change_verify():
 
                         hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256:300000', salt_length=16)
 
-                        with sqlite3.connect("users.db") as conn:
+                        with get_db() as conn:
                             cursor = conn.cursor()
                             cursor.execute("""
                                 UPDATE users_of_this_app 
@@ -1196,7 +1198,7 @@ def reset_password():
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -1260,7 +1262,7 @@ def reset_password():
                 salt = os.urandom(16)
                 change_token = serializer.dumps(email, salt=salt)
                 print("Wysyłam taki token: "+ str(change_token)+" na taki adres "+str(email)+" z takim linkiem: /reset_verify/"+str(change_token))
-                with sqlite3.connect("users.db") as conn:
+                with get_db() as conn:
                     cursor = conn.cursor()
                     cursor.execute("""
                             UPDATE users_of_this_app 
@@ -1339,7 +1341,7 @@ def reset_verify(change_token):
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -1429,7 +1431,7 @@ def reset_verify(change_token):
 
                         hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256:300000', salt_length=16)
 
-                        with sqlite3.connect("users.db") as conn:
+                        with get_db() as conn:
                             cursor = conn.cursor()
                             cursor.execute("""
                                 UPDATE users_of_this_app 
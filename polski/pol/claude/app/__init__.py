@@ -1,4 +1,8 @@
 from flask import Flask
 app = Flask(__name__)
 
-from app import views
\ No newline at end of file
+from app import views
+from app import padding
+from app import compression
+from app import metrics
+from app import retention
@@ -0,0 +1,142 @@
+from app import app
+from app.db import get_db
+from collections import deque
+from flask import has_request_context, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+import os
+import threading
+import time
+
+app.config.setdefault("ATTEMPTS_WINDOW", 10 * 60)
+app.config.setdefault("ATTEMPTS_MAX_PER_USER", 3)
+app.config.setdefault("ATTEMPTS_MAX_PER_IP", 20)
+app.config.setdefault("ATTEMPTS_BACKEND", "memory")
+app.config.setdefault("ATTEMPTS_MAX_KEYS", 100000)
+# Liczba zaufanych serwerów proxy przed aplikacją; tylko wtedy X-Forwarded-For wyznacza adres klienta
+app.config.setdefault("PROXY_HOPS", int(os.getenv("PROXY_HOPS", "0")))
+
+if app.config["PROXY_HOPS"]:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_HOPS"])
+
+TRACKED_EVENTS = ("LOGIN_ERROR", "TOPT_ERROR", "CHANGE_PASSWORD_ERROR", "RESET_PASSWORD_ERROR")
+
+
+class MemoryAttempts:
+    """Nieudane próby w pamięci: dla każdego klucza tylko ostatnie `limit` znaczników czasu"""
+
+    def __init__(self):
+        self._events = {}
+        self._lock = threading.Lock()
+        self._adds = 0
+
+    def add(self, key, limit, now):
+        with self._lock:
+            events = self._events.get(key)
+            if events is None and len(self._events) >= app.config["ATTEMPTS_MAX_KEYS"]:
+                self._prune(now)
+                # Przy pełnym słowniku ustępuje klucz dodany najdawniej
+                while len(self._events) >= app.config["ATTEMPTS_MAX_KEYS"]:
+                    del self._events[next(iter(self._events))]
+            if events is None or events.maxlen != limit:
+                events = self._events[key] = deque(events or (), maxlen=limit)
+            events.append(now)
+            self._adds += 1
+            if self._adds % 1000 == 0:
+                self._prune(now)
+
+    def count(self, key, now):
+        horizon = now - app.config["ATTEMPTS_WINDOW"]
+        with self._lock:
+            events = self._events.get(key)
+            if not events:
+                return 0
+            while events and events[0] <= horizon:
+                events.popleft()
+            return len(events)
+
+    def _prune(self, now):
+        horizon = now - app.config["ATTEMPTS_WINDOW"]
+        for key in [k for k, events in self._events.items() if not events or events[-1] <= horizon]:
+            del self._events[key]
+
+
+class SqliteAttempts:
+    """Nieudane próby w tabeli failed_attempts_of_this_app, wspólne dla procesów i restartów"""
+
+    def add(self, key, limit, now):
+        with get_db() as conn:
+            conn.execute("""
+                INSERT INTO failed_attempts_of_this_app (scope, attempt_key, event_type, attempted_at)
+                VALUES (?, ?, ?, ?)
+            """, (*key, now))
+            conn.execute("""
+                DELETE FROM failed_attempts_of_this_app
+                WHERE scope = ? AND attempt_key = ? AND event_type = ? AND attempted_at <= ?
+            """, (*key, now - app.config["ATTEMPTS_WINDOW"]))
+
+    def count(self, key, now):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT 1
+                    FROM failed_attempts_of_this_app
+                    WHERE scope = ? AND attempt_key = ? AND event_type = ? AND attempted_at > ?
+                    LIMIT ?
+                )
+            """, (*key, now - app.config["ATTEMPTS_WINDOW"], max(app.config["ATTEMPTS_MAX_PER_USER"], app.config["ATTEMPTS_MAX_PER_IP"])))
+            return cursor.fetchone()[0]
+
+
+_memory = MemoryAttempts()
+_sqlite = SqliteAttempts()
+
+
+def _store():
+    return _sqlite if app.config["ATTEMPTS_BACKEND"] == "sqlite" else _memory
+
+
+def _client_ip(ip_address):
+    # Nagłówki X-Forwarded-For i X-Real-IP ustawia klient, więc w żądaniu limit dotyczy adresu połączenia
+    # (za zaufanym proxy poprawionego przez ProxyFix); poza żądaniem, przy odtwarzaniu z dziennika, adresu z wpisu
+    return request.remote_addr if has_request_context() else ip_address
+
+
+def record_failed_attempt(event_type, user_id, ip_address, now=None):
+    """Zapisuje nieudaną próbę dla użytkownika i adresu IP"""
+    now = time.time() if now is None else now
+    ip_address = _client_ip(ip_address)
+    store = _store()
+    if user_id is not None:
+        store.add(("user", str(user_id), event_type), app.config["ATTEMPTS_MAX_PER_USER"], now)
+    if ip_address:
+        store.add(("ip", ip_address, event_type), app.config["ATTEMPTS_MAX_PER_IP"], now)
+
+
+def too_many_attempts(event_type, user_id, ip_address):
+    """Sprawdza, czy użytkownik lub adres IP przekroczył limit prób w oknie czasowym"""
+    now = time.time()
+    ip_address = _client_ip(ip_address)
+    store = _store()
+    if user_id is not None and store.count(("user", str(user_id), event_type), now) >= app.config["ATTEMPTS_MAX_PER_USER"]:
+        return True
+    if ip_address and store.count(("ip", ip_address, event_type), now) >= app.config["ATTEMPTS_MAX_PER_IP"]:
+        return True
+    return False
+
+
+def load_recent_attempts():
+    """Odtwarza liczniki w pamięci z ostatnich wpisów dziennika po restarcie"""
+    if app.config["ATTEMPTS_BACKEND"] == "sqlite":
+        return
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT event_type, user_id, ip_address, CAST(strftime('%s', timestamp) AS INTEGER)
+            FROM logs_of_this_app
+            WHERE event_type IN ({", ".join("?" * len(TRACKED_EVENTS))})
+            AND timestamp > DATETIME('now', ? || ' seconds')
+            ORDER BY timestamp
+        """, (*TRACKED_EVENTS, f"-{app.config['ATTEMPTS_WINDOW']}"))
+        for event_type, user_id, ip_address, attempted_at in cursor.fetchall():
+            record_failed_attempt(event_type, user_id, ip_address, now=attempted_at)
@@ -0,0 +1,121 @@
+from app import app
+from app.db import get_db
+from flask import g, has_app_context
+from datetime import datetime, timezone
+import atexit
+import queue
+import threading
+import time
+
+app.config.setdefault("AUDIT_BATCH_SIZE", 100)
+app.config.setdefault("AUDIT_FLUSH_INTERVAL", 1.0)
+
+_STOP = object()
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+_stats = {"queued": 0, "written": 0, "batches": 0}
+_stats_lock = threading.Lock()
+
+
+def _insert(conn, rows):
+    conn.executemany('''
+        INSERT INTO logs_of_this_app (event_type, event_details, user_id, timestamp, ip_address)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    with _stats_lock:
+        _stats["written"] += len(rows)
+        _stats["batches"] += 1
+
+
+def _write_batch(rows):
+    with app.app_context():
+        with get_db() as conn:
+            _insert(conn, rows)
+
+
+def _write_forever():
+    while True:
+        item = _queue.get()
+        if item is _STOP:
+            return
+        batch = [item]
+        deadline = time.monotonic() + app.config["AUDIT_FLUSH_INTERVAL"]
+        stop = False
+        while len(batch) < app.config["AUDIT_BATCH_SIZE"]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        try:
+            _write_batch(batch)
+        except Exception as e:
+            app.logger.exception("Audit log write failed: %s", e)
+        if stop:
+            return
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_forever, name="audit-writer", daemon=True)
+            _writer.start()
+
+
+def _drain():
+    rows = []
+    while True:
+        try:
+            item = _queue.get_nowait()
+        except queue.Empty:
+            return rows
+        if item is not _STOP:
+            rows.append(item)
+
+
+def queue_event(event_type, event_details=None, user_id=None, ip_address=None, sync=False):
+    """Dodaje zdarzenie do bufora dziennika; zdarzenia z sync=True są zapisywane od razu"""
+    row = (event_type, event_details, user_id, datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), ip_address)
+    with _stats_lock:
+        _stats["queued"] += 1
+    # Połączenie widoku z otwartą transakcją trzyma blokadę zapisu; drugie połączenie czekałoby na nie do końca
+    # DB_BUSY_TIMEOUT, więc wtedy zdarzenie trafia do bufora i zapisuje się, gdy widok zwolni blokadę
+    if sync and not (has_app_context() and "db" in g and g.db.in_transaction):
+        # Osobny kontekst aplikacji to osobne połączenie z puli: zdarzenie zatwierdza się we własnej transakcji,
+        # a nie razem z niedokończonymi zmianami widoku
+        _write_batch(_drain() + [row])
+        return
+    _queue.put(row)
+    _ensure_writer()
+
+
+def flush_audit_log():
+    """Zapisuje wszystkie zdarzenia oczekujące w buforze"""
+    rows = _drain()
+    if rows:
+        _write_batch(rows)
+
+
+def audit_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pending"] = _queue.qsize()
+    return stats
+
+
+@atexit.register
+def _shutdown():
+    if _writer is not None and _writer.is_alive():
+        _queue.put(_STOP)
+        _writer.join(timeout=5)
+    flush_audit_log()
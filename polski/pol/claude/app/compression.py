@@ -0,0 +1,69 @@
+from app import app
+from flask import request
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Kompresja stron z tokenem CSRF i treścią od użytkowników otwiera drogę atakom typu BREACH, więc jest domyślnie wyłączona
+app.config.setdefault("RESPONSE_COMPRESSION", ())
+app.config.setdefault("COMPRESSION_MIN_SIZE", 1024)
+app.config.setdefault("COMPRESSION_LEVEL", 6)
+app.config.setdefault("COMPRESSION_MIMETYPES", ("text/html", "text/css", "application/json", "application/javascript"))
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def _compress(encoding, data):
+    if encoding == "br":
+        return brotli.compress(data, quality=app.config["COMPRESSION_LEVEL"])
+    return gzip.compress(data, compresslevel=app.config["COMPRESSION_LEVEL"])
+
+
+def _choose_encoding():
+    for encoding in app.config["RESPONSE_COMPRESSION"]:
+        if encoding == "br" and brotli is None:
+            continue
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compression_stats():
+    """Bajty odpowiedzi przed i po kompresji dla każdego kodowania"""
+    with _lock:
+        return {encoding: dict(stats) for encoding, stats in _stats.items()}
+
+
+@app.after_request
+def compress_response(response):
+    if (not app.config["RESPONSE_COMPRESSION"]
+            or response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in app.config["COMPRESSION_MIMETYPES"]):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _choose_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < app.config["COMPRESSION_MIN_SIZE"]:
+        return response
+
+    compressed = _compress(encoding, data)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    # Skompresowana odpowiedź to inna reprezentacja strony; słaby ETag nadal pozwala odpowiedzieć 304
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    with _lock:
+        stats = _stats.setdefault(encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0})
+        stats["responses"] += 1
+        stats["bytes_in"] += len(data)
+        stats["bytes_out"] += len(compressed)
+    return response
@@ -0,0 +1,176 @@
+from app import app
+from app.timing import LATENCY_BUCKETS, add_timing
+from flask import request
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+import threading
+import time
+
+try:
+    from gevent import monkey as gevent_monkey
+    from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+except ImportError:
+    gevent_monkey = None
+
+app.config.setdefault("CRYPTO_WORKERS", os.cpu_count() or 1)
+app.config.setdefault("CRYPTO_QUEUE_LIMIT", 16)
+app.config.setdefault("CRYPTO_ENDPOINTS", (
+    "index", "verify", "render", "register", "change_password", "change_verify", "reset_password", "reset_verify",
+))
+
+
+class CryptoBusy(Exception):
+    """Kolejka operacji kryptograficznych jest pełna"""
+
+
+def _gevent_patched():
+    return gevent_monkey is not None and gevent_monkey.is_module_patched("threading")
+
+
+class CryptoExecutor:
+    """Ograniczona pula wątków dla PBKDF2, RSA i AES-GCM z limitem kolejki i histogramami opóźnień"""
+
+    def __init__(self):
+        self._pool = None
+        if _gevent_patched():
+            # Pod gevent wątki puli są prawdziwymi wątkami systemowymi, więc blokada i zmienne lokalne też muszą nimi być
+            self._lock = gevent_monkey.get_original("threading", "Lock")()
+            self._local = gevent_monkey.get_original("threading", "local")()
+        else:
+            self._lock = threading.Lock()
+            self._local = threading.local()
+        self._pending = 0
+        self._histograms = {}
+        self._rejected = {}
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # Po monkey.patch_all() zwykła pula składałaby się z greenletów, a PBKDF2 i RSA blokowałyby pętlę
+                    # zdarzeń, w tym usypianie wyrównujące czas odpowiedzi; pula gevent używa wątków systemowych
+                    pool_class = NativeThreadPoolExecutor if _gevent_patched() else ThreadPoolExecutor
+                    self._pool = pool_class(max_workers=app.config["CRYPTO_WORKERS"], thread_name_prefix="crypto")
+        return self._pool
+
+    def busy(self):
+        return self._pending >= app.config["CRYPTO_WORKERS"] + app.config["CRYPTO_QUEUE_LIMIT"]
+
+    def run(self, operation, fn, *args, **kwargs):
+        # Operacje zagnieżdżone (np. HKDF wewnątrz sprawdzania hasła) wykonują się w wątku, który już je obsługuje
+        if getattr(self._local, "worker", False):
+            return fn(*args, **kwargs)
+        with self._lock:
+            if self.busy():
+                self._rejected[operation] = self._rejected.get(operation, 0) + 1
+                raise CryptoBusy(operation)
+            self._pending += 1
+        submitted = time.perf_counter()
+        try:
+            future = self._submit(operation, submitted, fn, args, kwargs)
+            if future is None:
+                return fn(*args, **kwargs)
+            return future.result()
+        finally:
+            add_timing("crypto", time.perf_counter() - submitted)
+            with self._lock:
+                self._pending -= 1
+
+    def map(self, operation, fn, items, parallelism):
+        """Wykonuje fn(*args) dla każdej krotki z items, najwyżej `parallelism` naraz; wyniki w kolejności wejścia"""
+        if getattr(self._local, "worker", False) or parallelism <= 1:
+            return [self.run(operation, fn, *args) for args in items]
+        results = []
+        for start in range(0, len(items), parallelism):
+            batch = items[start:start + parallelism]
+            with self._lock:
+                if self.busy():
+                    self._rejected[operation] = self._rejected.get(operation, 0) + 1
+                    raise CryptoBusy(operation)
+                self._pending += len(batch)
+            try:
+                submitted = time.perf_counter()
+                futures = [self._submit(operation, submitted, fn, args, {}) for args in batch]
+                results.extend(fn(*args) if future is None else future.result() for args, future in zip(batch, futures))
+            finally:
+                add_timing("crypto", time.perf_counter() - submitted)
+                with self._lock:
+                    self._pending -= len(batch)
+        return results
+
+    def _submit(self, operation, submitted, fn, args, kwargs):
+        try:
+            return self._executor().submit(self._call, operation, submitted, fn, args, kwargs)
+        except RuntimeError:
+            # Pula jest już zamknięta przy wyjściu interpretera; wątki w tle kończą pracę na miejscu
+            return None
+
+    def _call(self, operation, submitted, fn, args, kwargs):
+        self._local.worker = True
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            finished = time.perf_counter()
+            self._observe(operation, started - submitted, finished - submitted)
+            self._local.worker = False
+
+    def _observe(self, operation, wait, latency):
+        with self._lock:
+            histogram = self._histograms.setdefault(operation, {
+                "count": 0, "sum": 0.0, "wait_sum": 0.0, "buckets": [0] * len(LATENCY_BUCKETS),
+            })
+            histogram["count"] += 1
+            histogram["sum"] += latency
+            histogram["wait_sum"] += wait
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    histogram["buckets"][i] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "workers": app.config["CRYPTO_WORKERS"],
+                "queue_limit": app.config["CRYPTO_QUEUE_LIMIT"],
+                "rejected": dict(self._rejected),
+                "operations": {
+                    operation: dict(histogram, buckets=list(histogram["buckets"]))
+                    for operation, histogram in self._histograms.items()
+                },
+            }
+
+
+crypto = CryptoExecutor()
+
+
+def crypto_operation(operation):
+    """Dekorator: funkcja wykonuje się w puli kryptograficznej i trafia do histogramu `operation`"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return crypto.run(operation, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def crypto_stats():
+    return crypto.stats()
+
+
+def _overloaded():
+    # Odrzucenie nie zdradza niczego o koncie, więc nie ma potrzeby wyrównywać czasu odpowiedzi
+    request.environ.pop("app.padding.delay", None)
+    return "Serwer jest przeciążony. Spróbuj ponownie za chwilę.", 503, {"Retry-After": "1"}
+
+
+@app.before_request
+def reject_when_busy():
+    if request.method == "POST" and request.endpoint in app.config["CRYPTO_ENDPOINTS"] and crypto.busy():
+        return _overloaded()
+
+
+@app.errorhandler(CryptoBusy)
+def crypto_busy(e):
+    return _overloaded()
@@ -0,0 +1,115 @@
+from app import app
+from app.db import get_db
+from app.ledger import PENDING_NOTE_SQL
+from datetime import datetime
+import base64
+
+app.config.setdefault("FEED_PAGE_SIZE", 50)
+
+FEED_QUERY = """
+    SELECT
+        n.id,
+        n.message,
+        n.created_at,
+        n.signature,
+        n.ip_address,
+        n.author,
+        u.id,
+        u.public_key,
+        n.like_count,
+        EXISTS (
+            SELECT 1
+            FROM likes_of_this_app l
+            WHERE l.note_id = n.id
+            AND l.user_id = (SELECT id FROM users_of_this_app WHERE username = :viewer)
+        ),
+        v.signature_digest,
+        v.key_fingerprint,
+        v.message_digest,
+        v.valid,
+        n.base_64,
+        n.signature_b64,
+        {pending}
+    FROM notes_of_this_app n
+    LEFT JOIN users_of_this_app u ON u.username = n.author
+    LEFT JOIN note_verifications_of_this_app v ON v.note_id = n.id
+    {where}
+    ORDER BY n.created_at DESC, n.id DESC
+    LIMIT :limit
+"""
+
+FEED_COLUMNS = (
+    "id", "message", "created_at", "signature", "ip_address", "author",
+    "author_id", "public_key", "likes", "user_liked",
+    "ledger_digest", "ledger_fingerprint", "ledger_message", "ledger_valid", "base_64", "signature_b64", "pending"
+)
+
+
+def encode_note(message, signature):
+    """Pola notatki do wyświetlenia (treść i podpis w base64), liczone raz przy zapisie"""
+    return base64.b64encode(message.encode("utf-8")).decode("utf-8"), base64.b64encode(signature).decode("utf-8")
+
+
+def backfill_note_fields(batch_size=500):
+    """Uzupełnia pola do wyświetlenia w notatkach zapisanych przed ich wprowadzeniem"""
+    while True:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, message, signature
+                FROM notes_of_this_app
+                WHERE base_64 IS NULL OR signature_b64 IS NULL
+                LIMIT ?
+            """, (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            cursor.executemany("""
+                UPDATE notes_of_this_app
+                SET base_64 = ?, signature_b64 = ?
+                WHERE id = ?
+            """, [(*encode_note(message, signature), note_id) for note_id, message, signature in rows])
+
+
+def parse_feed_cursor(args):
+    """Odczytuje kursor strony (created_at, id) z parametrów zapytania"""
+    created_at, note_id = args.get("before"), args.get("before_id", type=int)
+    if not created_at or note_id is None:
+        return None
+    try:
+        datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+    return created_at, note_id
+
+
+def fetch_feed(viewer, author=None, before=None, limit=None):
+    """Pobiera notatki z kluczem autora, liczbą lajków i lajkiem oglądającego w jednym zapytaniu"""
+    conditions = []
+    params = {"viewer": viewer, "author": author, "limit": -1}
+    if author is not None:
+        conditions.append("n.author = :author")
+    if before is not None:
+        conditions.append("(n.created_at, n.id) < (:before_created_at, :before_id)")
+        params["before_created_at"], params["before_id"] = before
+    if limit is not None:
+        params["limit"] = limit + 1
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(FEED_QUERY.format(where=where, pending=PENDING_NOTE_SQL), params)
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1][2], rows[-1][0])
+
+    notes = []
+    for row in rows:
+        note = dict(zip(FEED_COLUMNS, row))
+        note["user_liked"] = bool(note["user_liked"])
+        note["pending"] = bool(note["pending"])
+        notes.append(note)
+    return notes, next_cursor
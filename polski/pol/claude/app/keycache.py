@@ -0,0 +1,50 @@
+from app import app
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.backends import default_backend
+from collections import OrderedDict
+import threading
+
+app.config.setdefault("KEY_CACHE_SIZE", 256)
+
+_keys = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def get_author_key(author, public_key_bytes):
+    """Zwraca sparsowany klucz publiczny autora i jego PEM, korzystając z pamięci podręcznej LRU"""
+    with _lock:
+        entry = _keys.get(author)
+        if entry is not None and entry[0] == public_key_bytes:
+            _keys.move_to_end(author)
+            _stats["hits"] += 1
+            return entry[1], entry[2]
+        _stats["misses"] += 1
+
+    public_key = serialization.load_pem_public_key(public_key_bytes, backend=default_backend())
+    pem = public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode('utf-8')
+
+    with _lock:
+        _keys[author] = (public_key_bytes, public_key, pem)
+        _keys.move_to_end(author)
+        while len(_keys) > app.config["KEY_CACHE_SIZE"]:
+            _keys.popitem(last=False)
+            _stats["evictions"] += 1
+    return public_key, pem
+
+
+def invalidate_author_key(author):
+    """Usuwa klucz autora z pamięci podręcznej, np. po zmianie pary kluczy"""
+    with _lock:
+        if _keys.pop(author, None) is not None:
+            _stats["invalidations"] += 1
+
+
+def key_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_keys)
+    return stats
@@ -0,0 +1,119 @@
+from app import app
+from app.executor import crypto
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.backends import default_backend
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import queue
+import threading
+import time
+
+app.config.setdefault("KEYPOOL_ENABLED", True)
+app.config.setdefault("KEYPOOL_SIZE", 8)
+app.config.setdefault("KEYPOOL_WORKERS", 2)
+app.config.setdefault("KEYPOOL_START_METHOD", None)
+
+_stock = queue.Queue()
+_wakeup = threading.Event()
+_refiller = None
+_refiller_lock = threading.Lock()
+_generated_at = deque(maxlen=100)
+_stats = {"generated": 0, "served": 0, "fallbacks": 0, "errors": 0}
+
+
+def generate_keypair():
+    """Generuje parę kluczy RSA; zwraca (klucz prywatny PEM, klucz publiczny PEM)"""
+    private_key = rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=2048,
+        backend=default_backend()
+    )
+    private_key_bytes = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    public_key_bytes = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_key_bytes, public_key_bytes
+
+
+def _new_executor():
+    context = multiprocessing.get_context(app.config["KEYPOOL_START_METHOD"])
+    return ProcessPoolExecutor(max_workers=app.config["KEYPOOL_WORKERS"], mp_context=context)
+
+
+def _refill_forever():
+    executor = _new_executor()
+    while True:
+        missing = app.config["KEYPOOL_SIZE"] - _stock.qsize()
+        if missing <= 0:
+            _wakeup.wait()
+            _wakeup.clear()
+            continue
+        try:
+            futures = [executor.submit(generate_keypair) for _ in range(missing)]
+        except RuntimeError:
+            # Interpreter się zamyka
+            return
+        for future in as_completed(futures):
+            try:
+                keypair = future.result()
+            except BrokenProcessPool as e:
+                app.logger.exception("Key pool worker died: %s", e)
+                _stats["errors"] += 1
+                executor = _new_executor()
+                break
+            except Exception as e:
+                app.logger.exception("Key generation failed: %s", e)
+                _stats["errors"] += 1
+                continue
+            _stock.put(keypair)
+            _stats["generated"] += 1
+            _generated_at.append(time.monotonic())
+
+
+def _ensure_refiller():
+    global _refiller
+    if _refiller is not None:
+        return
+    with _refiller_lock:
+        if _refiller is None:
+            _refiller = threading.Thread(target=_refill_forever, name="keypool-refill", daemon=True)
+            _refiller.start()
+
+
+def take_keypair():
+    """Zwraca gotową parę kluczy z puli, a gdy pula jest pusta, generuje ją na miejscu"""
+    if app.config["KEYPOOL_ENABLED"]:
+        _ensure_refiller()
+        try:
+            keypair = _stock.get_nowait()
+            _stats["served"] += 1
+            return keypair
+        except queue.Empty:
+            pass
+        finally:
+            _wakeup.set()
+    _stats["fallbacks"] += 1
+    return crypto.run("rsa_generate", generate_keypair)
+
+
+def keypool_stats():
+    stats = dict(_stats)
+    stats["depth"] = _stock.qsize()
+    stats["capacity"] = app.config["KEYPOOL_SIZE"]
+    recent = list(_generated_at)
+    stats["refill_rate"] = (len(recent) - 1) / (recent[-1] - recent[0]) if len(recent) > 1 and recent[-1] > recent[0] else 0.0
+    return stats
+
+
+@app.before_request
+def start_keypool():
+    if _refiller is None and app.config["KEYPOOL_ENABLED"]:
+        _ensure_refiller()
@@ -0,0 +1,157 @@
+from app import app
+from app.db import get_db
+from app.executor import crypto_operation
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.hashes import SHA256
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.backends import default_backend
+from werkzeug.security import check_password_hash
+import hmac
+import os
+
+# Wersja 1: skrót werkzeug (300k) + osobne PBKDF2 (100k) dla klucza prywatnego i dla sekretu TOTP.
+# Wersja 2: jedno PBKDF2 (300k) hasła, z którego HKDF wyprowadza weryfikator i klucz do klucza prywatnego;
+# klucze serwera z SECRET_KEY są wyprowadzane raz przy starcie.
+KDF_VERSION = 2
+PASSWORD_ITERATIONS = 300000
+LEGACY_ITERATIONS = 100000
+PASSWORD_RECORD_PREFIX = "kdf2$"
+
+
+def _pbkdf2(secret, salt, iterations):
+    kdf = PBKDF2HMAC(
+        algorithm=SHA256(),
+        length=32,
+        salt=salt,
+        iterations=iterations,
+        backend=default_backend()
+    )
+    return kdf.derive(secret.encode())
+
+
+def _hkdf(key, salt, info):
+    return HKDF(algorithm=SHA256(), length=32, salt=salt, info=info, backend=default_backend()).derive(key)
+
+
+def _derive_server_keys(secret):
+    root = _pbkdf2(secret, b"notes-app-server-keys", LEGACY_ITERATIONS)
+    return {
+        "pepper": _hkdf(root, None, b"private-key-pepper"),
+        "totp": _hkdf(root, None, b"totp-wrapping-key"),
+        "jobs": _hkdf(root, None, b"resign-job-key"),
+    }
+
+
+_server_keys = {}
+
+
+def load_server_keys():
+    """Wyprowadza klucze serwera z SECRET_KEY; ponownie tylko po zmianie SECRET_KEY"""
+    secret = app.config["SECRET_KEY"]
+    if _server_keys.get("secret") != secret:
+        keys = _derive_server_keys(secret)
+        keys["secret"] = secret
+        _server_keys.clear()
+        _server_keys.update(keys)
+    return _server_keys
+
+
+def derive_user_keys(password, salt):
+    """Jedno PBKDF2 hasła daje weryfikator hasła i klucz szyfrujący klucz prywatny"""
+    master = _pbkdf2(password, salt, PASSWORD_ITERATIONS)
+    verifier = _hkdf(master, None, b"password-verifier")
+    kek = _hkdf(master, load_server_keys()["pepper"], b"private-key")
+    return PASSWORD_RECORD_PREFIX + verifier.hex(), kek
+
+
+@crypto_operation("password_hash")
+def new_password_keys(password):
+    """Zwraca (zapis hasła, sól, klucz do klucza prywatnego) dla nowego hasła"""
+    salt = os.urandom(16)
+    record, kek = derive_user_keys(password, salt)
+    return record, salt, kek
+
+
+@crypto_operation("password_check")
+def check_password(record, kdf_version, salt, password):
+    """Sprawdza hasło; zwraca (czy poprawne, klucz do klucza prywatnego lub None dla kont w wersji 1)"""
+    if kdf_version >= KDF_VERSION:
+        expected, kek = derive_user_keys(password, salt)
+        return hmac.compare_digest(record, expected), kek
+    return check_password_hash(record, password), None
+
+
+@crypto_operation("kek_derive")
+def private_key_kek(kdf_version, kek, password, salt):
+    """Klucz do odszyfrowania klucza prywatnego; dla kont w wersji 1 wyprowadzany po staremu"""
+    if kdf_version >= KDF_VERSION:
+        return kek
+    return _pbkdf2(password + app.config["SECRET_KEY"], salt, LEGACY_ITERATIONS)
+
+
+@crypto_operation("totp_key")
+def totp_key(kdf_version, topt_salt):
+    """Klucz szyfrujący sekret TOTP użytkownika"""
+    if kdf_version >= KDF_VERSION:
+        return _hkdf(load_server_keys()["totp"], topt_salt, b"totp-secret")
+    return _pbkdf2(app.config["SECRET_KEY"], topt_salt, LEGACY_ITERATIONS)
+
+
+@crypto_operation("totp_encrypt")
+def encrypt_totp_secret(totp_secret):
+    """Szyfruje sekret TOTP kluczem w bieżącej wersji; zwraca (szyfrogram, iv, tag, sól)"""
+    topt_salt = os.urandom(16)
+    return (*encrypt_data_gcm(totp_secret.encode(), totp_key(KDF_VERSION, topt_salt)), topt_salt)
+
+
+@crypto_operation("aes_gcm_encrypt")
+def encrypt_data_gcm(data, key):
+    """Szyfruje AES-GCM z losowym 12-bajtowym IV; zwraca (szyfrogram, iv, 16-bajtowy tag)"""
+    iv = os.urandom(12)
+    sealed = AESGCM(key).encrypt(iv, data, None)
+    return sealed[:-16], iv, sealed[-16:]
+
+
+@crypto_operation("aes_gcm_decrypt")
+def decrypt_data_gcm(ciphertext, key, iv, tag):
+    return AESGCM(key).decrypt(iv, ciphertext + tag, None)
+
+
+def wrap_job_key(private_key_bytes):
+    """Szyfruje klucz prywatny dla zadania w tle kluczem serwera; zwraca (szyfrogram, iv, tag)"""
+    return encrypt_data_gcm(private_key_bytes, load_server_keys()["jobs"])
+
+
+def unwrap_job_key(ciphertext, iv, tag):
+    return decrypt_data_gcm(ciphertext, load_server_keys()["jobs"], iv, tag)
+
+
+def upgrade_user_keys(username, password):
+    """Przenosi konto z wersji 1 do wersji 2; wywoływane po sprawdzeniu hasła"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT password, private_key, salt, iv, tag, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, kdf_version
+            FROM users_of_this_app
+            WHERE username = ?
+        """, (username,))
+        row = cursor.fetchone()
+        if not row or row[9] >= KDF_VERSION:
+            return
+        (record, encrypted_private_key, salt, iv, tag,
+         encrypted_totp_secret, totp_iv, totp_tag, topt_salt, kdf_version) = row
+
+        private_key_bytes = decrypt_data_gcm(encrypted_private_key, private_key_kek(kdf_version, None, password, salt), iv, tag)
+        totp_secret = decrypt_data_gcm(encrypted_totp_secret, totp_key(kdf_version, topt_salt), totp_iv, totp_tag).decode("utf-8")
+
+        record, salt, kek = new_password_keys(password)
+        encrypted_private_key, iv, tag = encrypt_data_gcm(private_key_bytes, kek)
+        encrypted_totp_secret, totp_iv, totp_tag, topt_salt = encrypt_totp_secret(totp_secret)
+        cursor.execute("""
+            UPDATE users_of_this_app
+            SET password = ?, private_key = ?, salt = ?, iv = ?, tag = ?,
+                encrypted_totp_secret = ?, totp_iv = ?, totp_tag = ?, topt_salt = ?, kdf_version = ?
+            WHERE username = ? AND kdf_version = ?
+        """, (record, encrypted_private_key, salt, iv, tag,
+              encrypted_totp_secret, totp_iv, totp_tag, topt_salt, KDF_VERSION, username, kdf_version))
@@ -0,0 +1,204 @@
+from app import app
+from app.db import get_db
+from app.executor import CryptoBusy, crypto, crypto_operation
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.backends import default_backend
+import hashlib
+import os
+import threading
+import time
+
+app.config.setdefault("LEDGER_SWEEP_ENABLED", True)
+app.config.setdefault("LEDGER_SWEEP_INTERVAL", 300)
+app.config.setdefault("LEDGER_SWEEP_BATCH", 200)
+app.config.setdefault("VERIFY_WORKERS", os.cpu_count() or 1)
+
+# Notatka czeka na ponowne podpisanie, dopóki leży w zakresie (last_note_id, max_note_id] aktywnego zadania autora
+PENDING_NOTE_SQL = """
+    EXISTS (
+        SELECT 1
+        FROM resign_jobs_of_this_app j
+        WHERE j.username = n.author AND j.status = 'pending'
+        AND n.id > j.last_note_id AND n.id <= j.max_note_id
+    )
+"""
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def signature_digest(signature):
+    return hashlib.sha256(signature).digest()
+
+
+def key_fingerprint(public_key_bytes):
+    return hashlib.sha256(public_key_bytes).digest()
+
+
+def message_digest(message):
+    return hashlib.sha256(message.encode()).digest()
+
+
+@crypto_operation("rsa_sign")
+def sign_message(private_key, message):
+    """Podpisuje notatkę kluczem prywatnym autora (RSA-PSS)"""
+    return private_key.sign(
+        message.encode(),
+        padding.PSS(
+            mgf=padding.MGF1(hashes.SHA256()),
+            salt_length=padding.PSS.MAX_LENGTH
+        ),
+        hashes.SHA256()
+    )
+
+
+@crypto_operation("rsa_verify")
+def verify_signature(public_key, message, signature):
+    """Weryfikuje podpis RSA-PSS notatki"""
+    return _verify_pss(public_key, message, signature)
+
+
+def _verify_pss(public_key, message, signature):
+    try:
+        public_key.verify(
+            signature,
+            message.encode(),
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
+        return True
+    except InvalidSignature:
+        return False
+
+
+def record_verification(note_id, message, signature, public_key_bytes, valid):
+    """Zapisuje wynik weryfikacji notatki w rejestrze"""
+    record_verifications([(note_id, message, signature, public_key_bytes, valid)])
+
+
+def record_verifications(results):
+    """Zapisuje w rejestrze wyniki (id notatki, treść, podpis, klucz publiczny, wynik) jednym poleceniem"""
+    with get_db() as conn:
+        conn.executemany("""
+            INSERT INTO note_verifications_of_this_app
+                (note_id, signature_digest, key_fingerprint, message_digest, valid, verified_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(note_id) DO UPDATE SET
+                signature_digest = excluded.signature_digest,
+                key_fingerprint = excluded.key_fingerprint,
+                message_digest = excluded.message_digest,
+                valid = excluded.valid,
+                verified_at = excluded.verified_at
+        """, [(note_id, signature_digest(signature), key_fingerprint(public_key_bytes), message_digest(message),
+               int(valid))
+              for note_id, message, signature, public_key_bytes, valid in results])
+
+
+def _verify_or_reject(public_key, message, signature):
+    try:
+        return _verify_pss(public_key, message, signature)
+    except Exception as e:
+        app.logger.warning("Błąd weryfikacji podpisu: %s", e)
+        return False
+
+
+def verify_batch(items):
+    """Weryfikuje równolegle trójki (klucz, treść, podpis) na VERIFY_WORKERS wątkach; wyniki w kolejności wejścia"""
+    return crypto.map("rsa_verify", _verify_or_reject, items, app.config["VERIFY_WORKERS"])
+
+
+def check_note(note, public_key):
+    """Zwraca wynik weryfikacji z rejestru, a dla notatek spoza rejestru weryfikuje podpis na żywo"""
+    return check_notes([note], [public_key])[0]
+
+
+def check_notes(notes, public_keys, skip_busy=False):
+    """check_note dla całej strony: notatki spoza rejestru są weryfikowane razem, a notatki czekające na ponowne podpisanie pomijane
+
+    Przy pełnej puli kryptograficznej zgłasza CryptoBusy, a z skip_busy zwraca None dla notatek, których nie udało się
+    sprawdzić; takich notatek nie wolno pokazać.
+    """
+    results = [True] * len(notes)
+    misses = []
+    for i, note in enumerate(notes):
+        if note.get("pending"):
+            continue
+        # Wpis rejestru obowiązuje tylko dla tej samej treści, podpisu i klucza; zmiana w bazie wymusza weryfikację
+        if (note["ledger_digest"] == signature_digest(note["signature"])
+                and note["ledger_fingerprint"] == key_fingerprint(note["public_key"])
+                and note["ledger_message"] == message_digest(note["message"])):
+            results[i] = bool(note["ledger_valid"])
+        else:
+            misses.append(i)
+    if not misses:
+        return results
+
+    try:
+        verified = verify_batch([(public_keys[i], notes[i]["message"], notes[i]["signature"]) for i in misses])
+    except CryptoBusy:
+        if not skip_busy:
+            raise
+        for i in misses:
+            results[i] = None
+        return results
+    for i, valid in zip(misses, verified):
+        results[i] = valid
+    record_verifications([
+        (notes[i]["id"], notes[i]["message"], notes[i]["signature"], notes[i]["public_key"], valid)
+        for i, valid in zip(misses, verified)
+    ])
+    return results
+
+
+def sweep_ledger(batch_size):
+    """Ponownie weryfikuje najdawniej sprawdzone notatki, wykrywając zmiany w bazie"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT n.id, n.message, n.signature, u.public_key
+            FROM note_verifications_of_this_app v
+            JOIN notes_of_this_app n ON n.id = v.note_id
+            JOIN users_of_this_app u ON u.username = n.author
+            WHERE NOT {PENDING_NOTE_SQL}
+            ORDER BY v.verified_at ASC
+            LIMIT ?
+        """, (batch_size,))
+        rows = cursor.fetchall()
+
+    tampered = []
+    for note_id, message, signature, public_key_bytes in rows:
+        public_key = serialization.load_pem_public_key(public_key_bytes, backend=default_backend())
+        valid = verify_signature(public_key, message, signature)
+        record_verification(note_id, message, signature, public_key_bytes, valid)
+        if not valid:
+            tampered.append(note_id)
+    return tampered
+
+
+def _sweep_forever():
+    from app.views import log_event
+
+    while True:
+        time.sleep(app.config["LEDGER_SWEEP_INTERVAL"])
+        try:
+            with app.app_context():
+                for note_id in sweep_ledger(app.config["LEDGER_SWEEP_BATCH"]):
+                    log_event("ERROR", f"Note_{note_id}_signature_invalid", None, None)
+        except Exception as e:
+            app.logger.exception("Ledger sweep failed: %s", e)
+
+
+@app.before_request
+def start_ledger_sweep():
+    global _sweeper
+    if _sweeper is not None or not app.config["LEDGER_SWEEP_ENABLED"]:
+        return
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, name="ledger-sweep", daemon=True)
+            _sweeper.start()
@@ -0,0 +1,47 @@
+from app import app
+from app.db import get_db
+import click
+
+# Rozbieżności między like_count a liczbą wierszy w likes_of_this_app
+MISMATCH_QUERY = """
+    SELECT n.id, n.like_count, COALESCE(l.likes, 0)
+    FROM notes_of_this_app n
+    LEFT JOIN (
+        SELECT note_id, COUNT(*) AS likes
+        FROM likes_of_this_app
+        GROUP BY note_id
+    ) l ON l.note_id = n.id
+    WHERE n.like_count != COALESCE(l.likes, 0)
+"""
+
+
+def backfill_like_counts(cursor):
+    """Jednorazowo wylicza like_count dla istniejących notatek"""
+    cursor.execute("""
+        UPDATE notes_of_this_app
+        SET like_count = (SELECT COUNT(*) FROM likes_of_this_app l WHERE l.note_id = notes_of_this_app.id)
+    """)
+
+
+def check_like_counts(repair=False):
+    """Zwraca notatki, których like_count nie zgadza się z tabelą lajków; z repair=True poprawia je"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(MISMATCH_QUERY)
+        mismatches = cursor.fetchall()
+        if repair and mismatches:
+            cursor.executemany(
+                "UPDATE notes_of_this_app SET like_count = ? WHERE id = ?",
+                [(actual, note_id) for note_id, _, actual in mismatches]
+            )
+    return mismatches
+
+
+@app.cli.command("check-likes")
+@click.option("--repair", is_flag=True, help="Popraw rozbieżne liczniki")
+def check_likes_command(repair):
+    """Sprawdza zgodność liczników lajków z tabelą lajków"""
+    mismatches = check_like_counts(repair=repair)
+    for note_id, stored, actual in mismatches:
+        click.echo(f"Notatka {note_id}: like_count={stored}, lajków={actual}")
+    click.echo(f"Rozbieżności: {len(mismatches)}" + (" (poprawione)" if repair and mismatches else ""))
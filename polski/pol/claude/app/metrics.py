@@ -0,0 +1,108 @@
+from app import app
+from app.audit import audit_stats
+from app.compression import compression_stats
+from app.db import pool_stats
+from app.executor import crypto_stats
+from app.keycache import key_cache_stats
+from app.keypool import keypool_stats
+from app.padding import padding_stats
+from app.rendering import render_cache_stats
+from app.resign import resign_stats
+from app.retention import retention_stats
+from app.timing import LATENCY_BUCKETS, route_timings
+from flask import abort, request
+
+app.config.setdefault("METRICS_ALLOWED_IPS", ("127.0.0.1", "::1"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+GAUGES = {"pending", "idle", "depth", "capacity", "refill_rate", "size"}
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _series(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+
+def _histogram(lines, name, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in samples:
+        for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            lines.append(f"{name}_bucket{_labels(labels, le=bound)} {count}")
+        lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {histogram['count']}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+
+
+def _flat_stats(lines, prefix, samples):
+    """Płaskie słowniki statystyk jako liczniki (sumy od startu) i wskaźniki (stan bieżący)"""
+    for key in sorted({key for _, stats in samples for key in stats}):
+        if key in GAUGES:
+            name, kind = f"{prefix}_{key}", "gauge"
+        elif key.endswith("_time"):
+            name, kind = f"{prefix}_{key[:-len('_time')]}_seconds_total", "counter"
+        else:
+            name, kind = f"{prefix}_{key}_total", "counter"
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, stats in samples:
+            if key in stats:
+                lines.append(f"{name}{_labels(labels)} {stats[key]}")
+
+
+def render_metrics():
+    """Wszystkie statystyki aplikacji w formacie tekstowym Prometheusa"""
+    lines = []
+    _histogram(lines, "app_request_seconds", "Czas obsługi żądania według trasy i składnika",
+               [({"route": route, "component": component}, histogram)
+                for (route, component), histogram in sorted(route_timings().items())])
+
+    crypto = crypto_stats()
+    operations = sorted(crypto["operations"].items())
+    _histogram(lines, "app_crypto_seconds", "Czas operacji kryptograficznej razem z oczekiwaniem w kolejce",
+               [({"operation": operation}, histogram) for operation, histogram in operations])
+    _series(lines, "app_crypto_wait_seconds_total", "counter", "Czas oczekiwania operacji w kolejce puli",
+            [({"operation": operation}, histogram["wait_sum"]) for operation, histogram in operations])
+    _series(lines, "app_crypto_rejected_total", "counter", "Operacje odrzucone przy pełnej kolejce",
+            [({"operation": operation}, count) for operation, count in sorted(crypto["rejected"].items())])
+    _series(lines, "app_crypto_pending", "gauge", "Operacje w toku i w kolejce", [({}, crypto["pending"])])
+
+    padding = sorted(padding_stats().items())
+    _series(lines, "app_padding_requests_total", "counter", "Żądania z ustalonym minimalnym czasem odpowiedzi",
+            [({"route": route}, stats["requests"]) for route, stats in padding])
+    _series(lines, "app_padding_padded_total", "counter", "Żądania, których odpowiedź trzeba było opóźnić",
+            [({"route": route}, stats["padded"]) for route, stats in padding])
+    _series(lines, "app_padding_sleep_seconds_total", "counter", "Łączny czas opóźniania odpowiedzi",
+            [({"route": route}, stats["sleep_total"]) for route, stats in padding])
+
+    _flat_stats(lines, "app_db", [({}, pool_stats())])
+    _flat_stats(lines, "app_keypool", [({}, keypool_stats())])
+    _flat_stats(lines, "app_key_cache", [({}, key_cache_stats())])
+    _flat_stats(lines, "app_render_cache", [({}, render_cache_stats())])
+    _flat_stats(lines, "app_audit", [({}, audit_stats())])
+    _flat_stats(lines, "app_log_retention", [({}, retention_stats())])
+    _flat_stats(lines, "app_compression", [({"encoding": encoding}, stats)
+                                           for encoding, stats in sorted(compression_stats().items())])
+
+    resign = sorted(resign_stats().items())
+    _series(lines, "app_resign_jobs", "gauge", "Zadania ponownego podpisywania według stanu",
+            [({"status": status}, stats["jobs"]) for status, stats in resign])
+    _series(lines, "app_resign_notes_left", "gauge", "Notatki czekające na ponowne podpisanie",
+            [({"status": status}, stats["notes_left"]) for status, stats in resign])
+    return "\n".join(lines) + "\n"
+
+
+@app.route("/metrics")
+def metrics():
+    if not app.config["METRICS_ENABLED"] or request.remote_addr not in app.config["METRICS_ALLOWED_IPS"]:
+        abort(404)
+    return render_metrics(), 200, {"Content-Type": CONTENT_TYPE}
@@ -0,0 +1,102 @@
+from app import app
+from app.timing import observe
+from flask import request
+import threading
+import time
+
+app.config.setdefault("RESPONSE_PADDING_ENABLED", True)
+app.config.setdefault("RESPONSE_DELAYS", {
+    "like_note": 2,
+    "render": 3,
+    "index": 3,
+    "verify": 4,
+    "register": 5,
+    "dashboard": 5,
+    "user_page": 3,
+    "change_password": 5,
+    "change_verify": 4,
+    "reset_password": 5,
+    "reset_verify": 3,
+    "logout": 1,
+})
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class ResponsePadding:
+    """Middleware WSGI wyrównujące czas odpowiedzi do minimalnego czasu trasy"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        start = time.monotonic()
+        body = self.wsgi_app(environ, start_response)
+        delay = environ.get("app.padding.delay")
+        if not delay:
+            return body
+        if environ.get("app.padding.streamed"):
+            return _PaddedStream(body, environ["app.padding.endpoint"], start, delay)
+        # Flask zakończył już obsługę żądania, więc połączenie z bazą wróciło do puli
+        _pad(environ["app.padding.endpoint"], start, delay)
+        return body
+
+
+class _PaddedStream:
+    """Strumieniowana odpowiedź, której czas jest dopełniany po wysłaniu ostatniego fragmentu"""
+
+    def __init__(self, body, endpoint, start, delay):
+        self.body = body
+        self.endpoint = endpoint
+        self.start = start
+        self.delay = delay
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            _pad(self.endpoint, self.start, self.delay)
+
+
+def _pad(endpoint, start, delay):
+    remaining = delay - (time.monotonic() - start)
+    if remaining > 0:
+        time.sleep(remaining)
+    _record(endpoint, max(remaining, 0.0))
+    # Dopełnienie trwa już po zamknięciu kontekstu żądania, więc trafia wprost do histogramu trasy
+    if app.config["METRICS_ENABLED"]:
+        observe(endpoint, "padding", max(remaining, 0.0))
+
+
+def _record(endpoint, slept):
+    with _stats_lock:
+        stats = _stats.setdefault(endpoint, {"requests": 0, "padded": 0, "sleep_total": 0.0, "sleep_max": 0.0})
+        stats["requests"] += 1
+        if slept > 0:
+            stats["padded"] += 1
+            stats["sleep_total"] += slept
+            stats["sleep_max"] = max(stats["sleep_max"], slept)
+
+
+def padding_stats():
+    """Czas spędzony na wyrównywaniu odpowiedzi dla każdej trasy"""
+    with _stats_lock:
+        return {endpoint: dict(stats) for endpoint, stats in _stats.items()}
+
+
+@app.before_request
+def set_response_delay():
+    if not app.config["RESPONSE_PADDING_ENABLED"]:
+        return
+    delay = app.config["RESPONSE_DELAYS"].get(request.endpoint)
+    if delay:
+        request.environ["app.padding.delay"] = delay
+        request.environ["app.padding.endpoint"] = request.endpoint
+
+
+app.wsgi_app = ResponsePadding(app.wsgi_app)
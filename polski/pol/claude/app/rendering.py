@@ -0,0 +1,77 @@
+from app import app
+from collections import OrderedDict
+import bleach
+import hashlib
+import markdown
+import threading
+
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent_monkey = None
+
+app.config.setdefault("RENDER_CACHE_SIZE", 512)
+
+ALLOWED_TAGS = [
+    'p', 'ul', 'img', 'li', 'ol', 'strong', 'em', 'a', 'blockquote', 'code', 'pre',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'br']
+ALLOWED_ATTRIBUTES = {
+     'a': ['href', 'title'],
+    'img': ['src', 'alt']
+}
+
+if gevent_monkey is not None and gevent_monkey.is_module_patched("threading"):
+    # Po monkey.patch_all() threading.local byłby osobny dla każdego greenletu; konwersja nie oddaje sterowania,
+    # więc greenlety jednego wątku systemowego mogą bezpiecznie dzielić silnik
+    _local = gevent_monkey.get_original("threading", "local")()
+else:
+    _local = threading.local()
+_fragments = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _engine():
+    # Markdown i Cleaner nie są bezpieczne wątkowo, więc każdy wątek ma własne, wielokrotnie używane instancje
+    engine = getattr(_local, "engine", None)
+    if engine is None:
+        engine = _local.engine = (
+            markdown.Markdown(),
+            bleach.sanitizer.Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
+        )
+    return engine
+
+
+def clean_html(html):
+    """Usuwa z HTML niedozwolone znaczniki i atrybuty"""
+    return _engine()[1].clean(html)
+
+
+def render_markdown(md):
+    """Zamienia markdown na oczyszczony HTML; wyniki są zapamiętywane według skrótu treści"""
+    key = hashlib.sha256(md.encode("utf-8")).digest()
+    with _lock:
+        html = _fragments.get(key)
+        if html is not None:
+            _fragments.move_to_end(key)
+            _stats["hits"] += 1
+            return html
+        _stats["misses"] += 1
+
+    converter, cleaner = _engine()
+    html = cleaner.clean(converter.reset().convert(md))
+
+    with _lock:
+        _fragments[key] = html
+        _fragments.move_to_end(key)
+        while len(_fragments) > app.config["RENDER_CACHE_SIZE"]:
+            _fragments.popitem(last=False)
+            _stats["evictions"] += 1
+    return html
+
+
+def render_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_fragments)
+    return stats
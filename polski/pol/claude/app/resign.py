@@ -0,0 +1,169 @@
+from app import app
+from app.db import get_db
+from app.executor import CryptoBusy
+from app.feed import encode_note
+from app.keys import unwrap_job_key
+from app.ledger import sign_message
+from app.rendering import clean_html
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.backends import default_backend
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
+import time
+
+app.config.setdefault("RESIGN_CHUNK_SIZE", 100)
+app.config.setdefault("RESIGN_WORKERS", 2)
+app.config.setdefault("RESIGN_POLL_INTERVAL", 60)
+app.config.setdefault("RESIGN_RETRY_DELAY", 1.0)
+
+_runner = None
+_runner_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def queue_resign_job(cursor, username, wrapped_key):
+    """Zakłada zadanie ponownego podpisania notatek autora w transakcji zmieniającej jego klucz
+
+    wrapped_key to wynik wrap_job_key, obliczony przed otwarciem transakcji: pod gevent operacja w puli
+    kryptograficznej oddaje sterowanie, a inne zapisy czekałyby w tym czasie na blokadę bazy.
+    """
+    # Nowe zadanie obejmuje wszystkie notatki, więc niedokończone poprzednie zadania nie są już potrzebne
+    cursor.execute("""
+        UPDATE resign_jobs_of_this_app
+        SET status = 'superseded', private_key = NULL, iv = NULL, tag = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE username = ? AND status = 'pending'
+    """, (username,))
+    cursor.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM notes_of_this_app WHERE author = ?", (username,))
+    max_note_id, total = cursor.fetchone()
+    if not total:
+        return None
+    encrypted_private_key, iv, tag = wrapped_key
+    cursor.execute("""
+        INSERT INTO resign_jobs_of_this_app (username, private_key, iv, tag, max_note_id, total)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (username, encrypted_private_key, iv, tag, max_note_id, total))
+    return cursor.lastrowid
+
+
+def _sign(private_key, message):
+    # Zadanie ustępuje żądaniom HTTP, gdy pula kryptograficzna jest pełna
+    while True:
+        try:
+            return sign_message(private_key, message)
+        except CryptoBusy:
+            time.sleep(app.config["RESIGN_RETRY_DELAY"])
+
+
+def run_resign_job(job_id):
+    """Podpisuje notatki porcjami; postęp zapisuje w tej samej transakcji co podpisy, więc zadanie można wznowić"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT username, private_key, iv, tag, last_note_id, max_note_id
+            FROM resign_jobs_of_this_app
+            WHERE id = ? AND status = 'pending'
+        """, (job_id,))
+        job = cursor.fetchone()
+    if job is None:
+        return
+    username, encrypted_private_key, iv, tag, last_note_id, max_note_id = job
+    private_key = serialization.load_pem_private_key(
+        unwrap_job_key(encrypted_private_key, iv, tag),
+        password=None,
+        backend=default_backend()
+    )
+
+    with ThreadPoolExecutor(max_workers=app.config["RESIGN_WORKERS"], thread_name_prefix="resign") as pool:
+        while True:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT id, message
+                    FROM notes_of_this_app
+                    WHERE author = ? AND id > ? AND id <= ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (username, last_note_id, max_note_id, app.config["RESIGN_CHUNK_SIZE"]))
+                rows = cursor.fetchall()
+            if not rows:
+                break
+
+            messages = [clean_html(message) for _, message in rows]
+            signatures = list(pool.map(functools.partial(_sign, private_key), messages))
+
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE resign_jobs_of_this_app
+                    SET last_note_id = ?, done = done + ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'pending'
+                """, (rows[-1][0], len(rows), job_id))
+                if cursor.rowcount == 0:
+                    # Zadanie zastąpione nowszym resetem hasła; jego podpisy są już nieaktualne
+                    conn.rollback()
+                    return
+                cursor.executemany("""
+                    UPDATE notes_of_this_app
+                    SET message = ?, signature = ?, base_64 = ?, signature_b64 = ?
+                    WHERE id = ?
+                """, [(message, signature, *encode_note(message, signature), note_id)
+                      for (note_id, _), message, signature in zip(rows, messages, signatures)])
+            last_note_id = rows[-1][0]
+
+    with get_db() as conn:
+        conn.execute("""
+            UPDATE resign_jobs_of_this_app
+            SET status = 'done', private_key = NULL, iv = NULL, tag = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'pending'
+        """, (job_id,))
+
+
+def _next_job():
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM resign_jobs_of_this_app WHERE status = 'pending' ORDER BY id LIMIT 1")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _run_forever():
+    while True:
+        _wakeup.clear()
+        try:
+            with app.app_context():
+                job_id = _next_job()
+                if job_id is not None:
+                    run_resign_job(job_id)
+                    continue
+        except Exception as e:
+            app.logger.exception("Re-signing job failed: %s", e)
+        _wakeup.wait(timeout=app.config["RESIGN_POLL_INTERVAL"])
+
+
+def start_resign_jobs():
+    """Uruchamia wątek zadań (wznawiając niedokończone) i budzi go po dodaniu nowego zadania"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = threading.Thread(target=_run_forever, name="resign-jobs", daemon=True)
+                _runner.start()
+    _wakeup.set()
+
+
+def resign_stats():
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT status, COUNT(*), COALESCE(SUM(total - done), 0)
+            FROM resign_jobs_of_this_app
+            GROUP BY status
+        """)
+        return {status: {"jobs": jobs, "notes_left": left} for status, jobs, left in cursor.fetchall()}
+
+
+@app.before_request
+def resume_resign_jobs():
+    if _runner is None:
+        start_resign_jobs()
@@ -0,0 +1,188 @@
+from app import app
+from app.db import get_db
+from datetime import datetime, timedelta, timezone
+import os
+import re
+import threading
+import time
+
+app.config.setdefault("LOG_RETENTION_ENABLED", True)
+app.config.setdefault("LOG_RETENTION_DAYS", 90)
+app.config.setdefault("LOG_RETENTION_INTERVAL", 3600)
+app.config.setdefault("LOG_RETENTION_BATCH", 500)
+app.config.setdefault("LOG_RETENTION_PAUSE", 0.05)
+app.config.setdefault("LOG_ARCHIVE_DATABASE", None)
+app.config.setdefault("LOG_VACUUM_PAGES", 256)
+
+ARCHIVE_SCHEMA = "log_archive"
+_MONTH = re.compile(r"^(\d{4})-(\d{2})-")
+
+_stats = {"runs": 0, "batches": 0, "archived": 0, "vacuumed_pages": 0}
+_runner = None
+_runner_lock = threading.Lock()
+_vacuum_warned = False
+
+
+def archive_path():
+    """Plik archiwum dziennika; domyślnie obok bazy z przyrostkiem _archive"""
+    if app.config["LOG_ARCHIVE_DATABASE"]:
+        return app.config["LOG_ARCHIVE_DATABASE"]
+    root, ext = os.path.splitext(app.config["DATABASE"])
+    return f"{root}_archive{ext or '.db'}"
+
+
+def partition_name(timestamp):
+    """Tabela archiwum dla miesiąca wpisu, np. logs_of_this_app_2024_05"""
+    match = _MONTH.match(timestamp or "")
+    if match is None:
+        return "logs_of_this_app_undated"
+    return f"logs_of_this_app_{match[1]}_{match[2]}"
+
+
+def retention_cutoff():
+    """Wpisy starsze niż ta chwila (UTC, w formacie kolumny timestamp) trafiają do archiwum"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=app.config["LOG_RETENTION_DAYS"])
+    return cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _archive_batch(conn, cutoff, batch_size):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, event_type, event_details, user_id, timestamp, ip_address
+        FROM logs_of_this_app
+        WHERE timestamp < ?
+        ORDER BY timestamp
+        LIMIT ?
+    """, (cutoff, batch_size))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    partitions = {}
+    for row in rows:
+        partitions.setdefault(partition_name(row[4]), []).append(row)
+    for partition, partition_rows in partitions.items():
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{partition} (
+                id INTEGER PRIMARY KEY,
+                event_type TEXT NOT NULL,
+                event_details TEXT,
+                user_id INTEGER,
+                timestamp DATETIME,
+                ip_address TEXT
+            )
+        """)
+        # Zatwierdzenie obejmujące bazę w trybie WAL i archiwum nie jest atomowe; po awarii wpis może zostać
+        # w obu plikach, ale nie zniknie z obu, a ponowne przeniesienie pomija duplikat
+        cursor.executemany(f"""
+            INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.{partition}
+                (id, event_type, event_details, user_id, timestamp, ip_address)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, partition_rows)
+    cursor.executemany("DELETE FROM logs_of_this_app WHERE id = ?", [(row[0],) for row in rows])
+    conn.commit()
+    return len(rows)
+
+
+def _incremental_vacuum(conn):
+    global _vacuum_warned
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA auto_vacuum")
+    if cursor.fetchone()[0] != 2:
+        if not _vacuum_warned:
+            _vacuum_warned = True
+            app.logger.warning("Database was created without auto_vacuum=INCREMENTAL; freed pages are reused "
+                               "but the file will not shrink until a one-time VACUUM")
+        return 0
+    cursor.execute("PRAGMA freelist_count")
+    free = cursor.fetchone()[0]
+    # Zwalniamy najwyżej tyle stron, ile było wolnych na początku; strony zwolnione w międzyczasie przez inne zapisy
+    # poczekają na następny przebieg
+    budget = free
+    vacuumed = 0
+    while free and vacuumed < budget:
+        pages = min(free, budget - vacuumed, app.config["LOG_VACUUM_PAGES"])
+        # execute() wykonuje tylko jeden krok polecenia, czyli zwalnia jedną stronę; executescript wykonuje je do końca
+        cursor.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        cursor.execute("PRAGMA freelist_count")
+        remaining = cursor.fetchone()[0]
+        if remaining >= free:
+            break
+        vacuumed += free - remaining
+        free = remaining
+        time.sleep(app.config["LOG_RETENTION_PAUSE"])
+    return vacuumed
+
+
+def archive_logs(cutoff=None):
+    """Przenosi wpisy dziennika starsze niż horyzont do archiwum małymi partiami; zwraca liczbę przeniesionych"""
+    cutoff = cutoff or retention_cutoff()
+    batch_size = app.config["LOG_RETENTION_BATCH"]
+    archived = 0
+    with get_db() as conn:
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path(),))
+        try:
+            while True:
+                moved = _archive_batch(conn, cutoff, batch_size)
+                archived += moved
+                if moved:
+                    _stats["batches"] += 1
+                    _stats["archived"] += moved
+                if moved < batch_size:
+                    break
+                # Przerwa między partiami pozwala zapisać się bieżącym zdarzeniom
+                time.sleep(app.config["LOG_RETENTION_PAUSE"])
+        finally:
+            conn.rollback()
+            conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+        if archived:
+            _stats["vacuumed_pages"] += _incremental_vacuum(conn)
+    _stats["runs"] += 1
+    return archived
+
+
+def archived_partitions():
+    """Nazwy tabel archiwum i liczba wpisów w każdej"""
+    if not os.path.exists(archive_path()):
+        return {}
+    with get_db() as conn:
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path(),))
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT name FROM {ARCHIVE_SCHEMA}.sqlite_master
+                WHERE type = 'table' AND name LIKE 'logs_of_this_app_%'
+                ORDER BY name
+            """)
+            partitions = {}
+            for (name,) in cursor.fetchall():
+                cursor.execute(f"SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.{name}")
+                partitions[name] = cursor.fetchone()[0]
+            return partitions
+        finally:
+            conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+
+def retention_stats():
+    return dict(_stats)
+
+
+def _retain_forever():
+    while True:
+        time.sleep(app.config["LOG_RETENTION_INTERVAL"])
+        try:
+            with app.app_context():
+                archive_logs()
+        except Exception as e:
+            app.logger.exception("Log retention failed: %s", e)
+
+
+@app.before_request
+def start_log_retention():
+    global _runner
+    if _runner is not None or not app.config["LOG_RETENTION_ENABLED"]:
+        return
+    with _runner_lock:
+        if _runner is None:
+            _runner = threading.Thread(target=_retain_forever, name="log-retention", daemon=True)
+            _runner.start()
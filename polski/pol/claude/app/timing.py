@@ -0,0 +1,98 @@
+from app import app
+from app.db import db_stats
+from flask import before_render_template, g, has_app_context, request, template_rendered
+import threading
+import time
+
+app.config.setdefault("METRICS_ENABLED", False)
+# Nagłówek pokazuje klientowi czas kryptografii i bazy, czyli dokładnie to, co ukrywa wyrównywanie czasu odpowiedzi;
+# włączać tylko do diagnostyki
+app.config.setdefault("SERVER_TIMING", False)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMPONENTS = ("db", "crypto", "template")
+
+_histograms = {}
+_lock = threading.Lock()
+
+
+def add_timing(component, seconds):
+    """Dolicza czas składnika do bieżącego żądania, jeśli jest ono mierzone"""
+    timings = g.get("timings") if has_app_context() else None
+    if timings is not None:
+        timings[component] = timings.get(component, 0.0) + seconds
+
+
+def observe(route, component, seconds):
+    with _lock:
+        histogram = _histograms.setdefault((route, component), {
+            "count": 0, "sum": 0.0, "buckets": [0] * len(LATENCY_BUCKETS),
+        })
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+
+
+def route_timings():
+    """Histogramy czasu składników dla każdej pary (trasa, składnik)"""
+    with _lock:
+        return {key: dict(histogram, buckets=list(histogram["buckets"])) for key, histogram in _histograms.items()}
+
+
+def _breakdown():
+    timings = dict.fromkeys(COMPONENTS, 0.0)
+    timings.update(g.timings)
+    timings["db"] = db_stats()["query_time"]
+    timings["total"] = time.perf_counter() - g.timings_started
+    return timings
+
+
+@app.before_request
+def start_timings():
+    if app.config["METRICS_ENABLED"] or app.config["SERVER_TIMING"]:
+        g.timings = {}
+        g.timings_started = time.perf_counter()
+
+
+@before_render_template.connect_via(app)
+def start_template_timing(sender, template, context, **extra):
+    if g.get("timings") is not None:
+        request.environ["app.timing.template"] = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def stop_template_timing(sender, template, context, **extra):
+    started = request.environ.pop("app.timing.template", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if g.get("timings") is not None:
+        add_timing("template", elapsed)
+    elif app.config["METRICS_ENABLED"]:
+        # Strumieniowany szablon kończy się po zamknięciu żądania, w nowym kontekście aplikacji
+        observe(request.endpoint or "none", "template", elapsed)
+
+
+@app.after_request
+def add_server_timing(response):
+    if app.config["SERVER_TIMING"] and g.get("timings") is not None:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{component};dur={seconds * 1000:.2f}" for component, seconds in _breakdown().items()
+        )
+    return response
+
+
+@app.teardown_request
+def record_timings(exception=None):
+    if g.get("timings") is None or not app.config["METRICS_ENABLED"]:
+        return
+    route = request.endpoint or "none"
+    timings = _breakdown()
+    if "app.timing.template" in request.environ:
+        # Szablon jest jeszcze strumieniowany; jego czas zapisze stop_template_timing
+        del timings["template"]
+    for component, seconds in timings.items():
+        observe(route, component, seconds)
+    g.pop("timings")
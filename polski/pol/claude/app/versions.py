@@ -0,0 +1,126 @@
+from app import app
+from app.db import get_db
+from flask import make_response, request, session
+from collections import OrderedDict
+from datetime import datetime, timezone
+import hashlib
+import os
+import threading
+import time
+
+app.config.setdefault("ETAG_MAX_AGE", 30 * 60)
+
+_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+_INCOMPLETE_LIMIT = 1024
+
+# ETagi stron wysłanych bez części notatek; w pamięci procesu, bo ich nagłówki wyszły przed treścią
+_incomplete = OrderedDict()
+_incomplete_lock = threading.Lock()
+
+
+def _bump(scope_sql, source=""):
+    return f"""
+        INSERT INTO content_versions_of_this_app (scope, version, updated_at)
+        SELECT {scope_sql}, 1, {_NOW} {source}
+        ON CONFLICT(scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+    """
+
+
+def _bump_note_author(note_id_sql):
+    return _bump("'author:' || author", f"FROM notes_of_this_app WHERE id = {note_id_sql}")
+
+
+# Każda zmiana widoczna na tablicy lub stronie autora podbija wersję globalną i wersję autora
+VERSION_TRIGGERS = {
+    "trg_versions_note_insert": ("AFTER INSERT ON notes_of_this_app",
+                                 _bump("'global'", "WHERE true") + _bump("'author:' || NEW.author", "WHERE true")),
+    "trg_versions_note_update": ("AFTER UPDATE ON notes_of_this_app",
+                                 _bump("'global'", "WHERE true") + _bump("'author:' || NEW.author", "WHERE true")),
+    "trg_versions_note_delete": ("AFTER DELETE ON notes_of_this_app",
+                                 _bump("'global'", "WHERE true") + _bump("'author:' || OLD.author", "WHERE true")),
+    "trg_versions_like_insert": ("AFTER INSERT ON likes_of_this_app",
+                                 _bump("'global'", "WHERE true") + _bump_note_author("NEW.note_id")),
+    "trg_versions_like_delete": ("AFTER DELETE ON likes_of_this_app",
+                                 _bump("'global'", "WHERE true") + _bump_note_author("OLD.note_id")),
+    "trg_versions_key_rotation": ("AFTER UPDATE OF public_key ON users_of_this_app",
+                                  _bump("'global'", "WHERE true") + _bump("'author:' || NEW.username", "WHERE true")),
+    "trg_versions_resign_job": ("AFTER UPDATE OF status, last_note_id ON resign_jobs_of_this_app",
+                                _bump("'global'", "WHERE true") + _bump("'author:' || NEW.username", "WHERE true")),
+}
+
+
+def create_version_triggers(cursor):
+    """Tworzy tabelę wersji treści i wyzwalacze, które ją aktualizują"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS content_versions_of_this_app (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    for name, (event, body) in VERSION_TRIGGERS.items():
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+
+def _build_tag():
+    # Zmiana szablonów lub kodu po wdrożeniu unieważnia zapamiętane strony
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for directory in (root, os.path.join(root, "templates")):
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                digest.update(f"{name}:{os.path.getmtime(path)}".encode())
+    return digest.hexdigest()
+
+
+BUILD_TAG = _build_tag()
+
+
+def page_validators(author=None):
+    """Wylicza ETag i Last-Modified strony z wersji treści, bez odczytu notatek i kluczy"""
+    scope = "global" if author is None else f"author:{author}"
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT version, updated_at FROM content_versions_of_this_app WHERE scope = ?", (scope,))
+        row = cursor.fetchone() or (0, 0.0)
+    version, updated_at = row
+    # Strona zawiera token CSRF, więc co ETAG_MAX_AGE sekund jest generowana od nowa
+    epoch = int(time.time() // app.config["ETAG_MAX_AGE"])
+    etag = hashlib.sha256("\0".join(map(str, (
+        BUILD_TAG, session.get("user"), request.full_path, scope, version, epoch
+    ))).encode()).hexdigest()
+    return etag, datetime.fromtimestamp(int(max(updated_at, epoch * app.config["ETAG_MAX_AGE"])), timezone.utc)
+
+
+def mark_incomplete(etag):
+    """Strona z tym ETagiem nie zawiera wszystkich notatek, więc następne wejście musi ją wygenerować od nowa"""
+    with _incomplete_lock:
+        _incomplete[etag] = True
+        if len(_incomplete) > _INCOMPLETE_LIMIT:
+            _incomplete.popitem(last=False)
+
+
+def not_modified(etag, last_modified):
+    """Zwraca odpowiedź 304, jeśli przeglądarka ma aktualną wersję strony"""
+    with _incomplete_lock:
+        incomplete = _incomplete.pop(etag, False)
+    # Komunikaty flash są zużywane przy renderowaniu, więc strona z nimi nie może przyjść z pamięci przeglądarki
+    if session.get("_flashes") or incomplete:
+        return None
+    response = app.response_class()
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response = response.make_conditional(request)
+    return response if response.status_code == 304 else None
+
+
+def with_validators(body, etag, last_modified):
+    response = make_response(body)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -1,32 +1,34 @@
 from app import app
-from flask import Flask, redirect, url_for, render_template, request, session, flash, request, abort
+from flask import redirect, url_for, render_template, request, session, flash, get_flashed_messages
 import sqlite3
-import markdown
-import bleach
+from app.db import get_db
+from app.rendering import render_markdown
+from app.likes import backfill_like_counts
+from app.versions import create_version_triggers, mark_incomplete, not_modified, page_validators, with_validators
+from app.executor import CryptoBusy, crypto
+from app.feed import backfill_note_fields, encode_note, fetch_feed, parse_feed_cursor
+from app.ledger import check_notes, record_verification, sign_message, verify_signature
+from app.keycache import get_author_key, invalidate_author_key
+from app.attempts import TRACKED_EVENTS, load_recent_attempts, record_failed_attempt, too_many_attempts
+from app.audit import queue_event
+from app.keypool import take_keypair
+from app.resign import queue_resign_job, start_resign_jobs
+from app.keys import KDF_VERSION, check_password, decrypt_data_gcm, encrypt_data_gcm, load_server_keys, encrypt_totp_secret, new_password_keys, private_key_kek, totp_key, upgrade_user_keys, wrap_job_key
 import re
-from werkzeug.security import generate_password_hash, check_password_hash
-from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives.hashes import SHA256
 from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
 from flask_wtf import CSRFProtect
 from itsdangerous import URLSafeTimedSerializer
 import os
-import re
 import pyotp
 import qrcode
 import io
 import base64
-from datetime import datetime, timedelta
-import base64
-import time
-from flask import jsonify
+from flask import jsonify, stream_template
 
 csrf = CSRFProtect(app)
+app.config.setdefault("DASHBOARD_STREAMING", False)
+app.config.setdefault("DASHBOARD_STREAM_CHUNK", 10)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'DJ~AuNK#nV-5kp.=F=kr~0LK][{kS@')
 secret_key = app.config['SECRET_KEY']
 
@@ -34,16 +36,15 @@ serializer = URLSafeTimedSerializer(secret_key)
 
 
 
-ALLOWED_TAGS = [
-    'p', 'ul', 'img', 'li', 'ol', 'strong', 'em', 'a', 'blockquote', 'code', 'pre',
-    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'br']
-ALLOWED_ATTRIBUTES = {
-     'a': ['href', 'title'],
-    'img': ['src', 'alt']
-}
+def add_column_if_missing(cursor, table, column, definition):
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    return False
 
 def init_db():
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users_of_this_app (
@@ -62,9 +63,11 @@ def init_db():
                 totp_tag BLOB NOT NULL,
                 topt_salt BLOB NOT NULL,
                 reset_password_token TEXT,
-                reset_password_salt BLOB
+                reset_password_salt BLOB,
+                kdf_version INTEGER NOT NULL DEFAULT 1
             )
         ''')
+        add_column_if_missing(cursor, "users_of_this_app", "kdf_version", "INTEGER NOT NULL DEFAULT 1")
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS notes_of_this_app (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -72,9 +75,14 @@ def init_db():
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
                 author TEXT NOT NULL,
                 signature BLOB NOT NULL,
-                ip_address TEXT NOT NULL
+                ip_address TEXT NOT NULL,
+                base_64 TEXT,
+                signature_b64 TEXT,
+                like_count INTEGER NOT NULL DEFAULT 0
             )
         ''')
+        add_column_if_missing(cursor, "notes_of_this_app", "base_64", "TEXT")
+        add_column_if_missing(cursor, "notes_of_this_app", "signature_b64", "TEXT")
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS logs_of_this_app (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -97,24 +105,114 @@ def init_db():
                 UNIQUE(note_id, user_id)
             )
         ''')
+        if add_column_if_missing(cursor, "notes_of_this_app", "like_count", "INTEGER NOT NULL DEFAULT 0"):
+            backfill_like_counts(cursor)
+        # like_count jest utrzymywany przez wyzwalacze, więc odczyt liczby lajków nie wymaga agregacji
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_likes_insert
+            AFTER INSERT ON likes_of_this_app
+            BEGIN
+                UPDATE notes_of_this_app SET like_count = like_count + 1 WHERE id = NEW.note_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_likes_delete
+            AFTER DELETE ON likes_of_this_app
+            BEGIN
+                UPDATE notes_of_this_app SET like_count = like_count - 1 WHERE id = OLD.note_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_likes_update_note
+            AFTER UPDATE OF note_id ON likes_of_this_app
+            BEGIN
+                UPDATE notes_of_this_app SET like_count = like_count - 1 WHERE id = OLD.note_id;
+                UPDATE notes_of_this_app SET like_count = like_count + 1 WHERE id = NEW.note_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS note_verifications_of_this_app (
+                note_id INTEGER PRIMARY KEY,
+                signature_digest BLOB NOT NULL,
+                key_fingerprint BLOB NOT NULL,
+                message_digest BLOB,
+                valid INTEGER NOT NULL,
+                verified_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                FOREIGN KEY (note_id) REFERENCES notes_of_this_app(id) ON DELETE CASCADE
+            )
+        ''')
+        # Wpisy sprzed tej kolumny nie pasują do żadnej treści, więc notatki zostaną raz zweryfikowane na nowo
+        add_column_if_missing(cursor, "note_verifications_of_this_app", "message_digest", "BLOB")
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notes_created_at_id
+            ON notes_of_this_app (created_at, id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notes_author_created_at_id
+            ON notes_of_this_app (author, created_at, id)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS failed_attempts_of_this_app (
+                scope TEXT NOT NULL,
+                attempt_key TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                attempted_at REAL NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_failed_attempts_key
+            ON failed_attempts_of_this_app (scope, attempt_key, event_type, attempted_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_logs_event_type_timestamp
+            ON logs_of_this_app (event_type, timestamp)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_logs_timestamp
+            ON logs_of_this_app (timestamp)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_note_verifications_verified_at
+            ON note_verifications_of_this_app (verified_at)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resign_jobs_of_this_app (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                private_key BLOB,
+                iv BLOB,
+                tag BLOB,
+                last_note_id INTEGER NOT NULL DEFAULT 0,
+                max_note_id INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_resign_jobs_username_status
+            ON resign_jobs_of_this_app (username, status)
+        ''')
+        create_version_triggers(cursor)
         conn.commit()
 
-init_db()
+with app.app_context():
+    init_db()
+    backfill_note_fields()
+    load_recent_attempts()
+    load_server_keys()
 @app.route("/like/<int:note_id>", methods=["POST"])
 def like_note(note_id):
-    delay = 2
-    start_time = time.time()
-    
     username = session.get("user")
     ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
     
     if not username:
-        if time.time() - start_time < delay:
-            time.sleep(delay - (time.time() - start_time))
         log_event("ERROR", "Like_attempt_not_logged", None, ip_address)
         return jsonify({"success": False, "message": "Musisz być zalogowany"}), 401
     
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         
         # Pobierz user_id
@@ -122,8 +220,6 @@ def like_note(note_id):
         user = cursor.fetchone()
         
         if not user:
-            if time.time() - start_time < delay:
-                time.sleep(delay - (time.time() - start_time))
             return jsonify({"success": False, "message": "Użytkownik nie istnieje"}), 404
         
         user_id = user[0]
@@ -133,8 +229,6 @@ def like_note(note_id):
         note = cursor.fetchone()
         
         if not note:
-            if time.time() - start_time < delay:
-                time.sleep(delay - (time.time() - start_time))
             log_event("ERROR", f"Like_attempt_invalid_note_{note_id}", user_id, ip_address)
             return jsonify({"success": False, "message": "Notatka nie istnieje"}), 404
         
@@ -151,17 +245,12 @@ def like_note(note_id):
                 "DELETE FROM likes_of_this_app WHERE note_id = ? AND user_id = ?",
                 (note_id, user_id)
             )
-            conn.commit()
-            
-            # Pobierz aktualną liczbę lajków
-            cursor.execute("SELECT COUNT(*) FROM likes_of_this_app WHERE note_id = ?", (note_id,))
+            cursor.execute("SELECT like_count FROM notes_of_this_app WHERE id = ?", (note_id,))
             like_count = cursor.fetchone()[0]
+            conn.commit()
             
             log_event("UNLIKE", f"Note_{note_id}_unliked", user_id, ip_address)
             
-            if time.time() - start_time < delay:
-                time.sleep(delay - (time.time() - start_time))
-            
             return jsonify({"success": True, "action": "unliked", "likes": like_count}), 200
         else:
             # Dodaj lajka
@@ -170,46 +259,17 @@ def like_note(note_id):
                     "INSERT INTO likes_of_this_app (note_id, user_id) VALUES (?, ?)",
                     (note_id, user_id)
                 )
-                conn.commit()
-                
-                # Pobierz aktualną liczbę lajków
-                cursor.execute("SELECT COUNT(*) FROM likes_of_this_app WHERE note_id = ?", (note_id,))
+                cursor.execute("SELECT like_count FROM notes_of_this_app WHERE id = ?", (note_id,))
                 like_count = cursor.fetchone()[0]
+                conn.commit()
                 
                 log_event("LIKE", f"Note_{note_id}_liked", user_id, ip_address)
                 
-                if time.time() - start_time < delay:
-                    time.sleep(delay - (time.time() - start_time))
-                
                 return jsonify({"success": True, "action": "liked", "likes": like_count}), 200
             except sqlite3.IntegrityError:
-                if time.time() - start_time < delay:
-                    time.sleep(delay - (time.time() - start_time))
                 return jsonify({"success": False, "message": "Już polubiłeś tę notatkę"}), 400
             
 
-def generate_key_from_password(password, salt):
-    kdf = PBKDF2HMAC(
-        algorithm=SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100000,
-        backend=default_backend()
-    )
-    return kdf.derive(password.encode())
-
-def encrypt_data_gcm(data, key):
-    iv = os.urandom(12)
-    cipher = Cipher(algorithms.AES(key), modes.GCM(iv), backend=default_backend())
-    encryptor = cipher.encryptor()
-    ciphertext = encryptor.update(data) + encryptor.finalize()
-    return ciphertext, iv, encryptor.tag
-
-def decrypt_data_gcm(ciphertext, key, iv, tag):
-    cipher = Cipher(algorithms.AES(key), modes.GCM(iv, tag), backend=default_backend())
-    decryptor = cipher.decryptor()
-    return decryptor.update(ciphertext) + decryptor.finalize()
-
 # @app.errorhandler(CSRFError)
 # def handle_csrf_error(e):
 #     flash("Nieprawidłowy token CSRF. Spróbuj ponownie.", "danger")
@@ -217,8 +277,6 @@ def decrypt_data_gcm(ciphertext, key, iv, tag):
 
 @app.route("/render", methods=['GET', 'POST'])
 def render():
-    delay = 3
-    start_time = time.time()
     if request.method == "POST":
         # csrf_token = request.form.get("csrf_token")
         # if not csrf_token or csrf_token != session.get("_csrf_token"):
@@ -229,19 +287,15 @@ def render():
         ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
         if len(md) > 1000:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Tekst jest zbyt długi!", "danger")
             return redirect(url_for("index"))
         
         username = session.get("user")
         if not username:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             log_event("ERROR", "Someone_not_logged", None, ip_address)
             flash("Musisz być zalogowany, aby dodać notatkę.", "danger")
             return redirect(url_for("index"))
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                     SELECT id
@@ -253,29 +307,28 @@ def render():
             id = user[0]
         else:
             flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             return redirect(url_for("index"))
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT password, private_key, iv, tag, salt FROM users_of_this_app WHERE username = ?", (username,))
+            cursor.execute("SELECT password, private_key, iv, tag, salt, public_key, kdf_version FROM users_of_this_app WHERE username = ?", (username,))
             user_data = cursor.fetchone()
 
-        if not user_data or not check_password_hash(user_data[0], password):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
+        password_ok, kek = False, None
+        if user_data:
+            password_ok, kek = check_password(user_data[0], user_data[6], user_data[4], password)
+        if not password_ok:
             log_event("LOGIN_ERROR", "Wrong_login_data", id, ip_address)
             flash("Nieprawidłowe hasło.", "danger")
             return redirect(url_for("index"))
 
         encrypted_private_key, iv, tag, salt = user_data[1], user_data[2], user_data[3], user_data[4]
         try:
-            decryption_key = generate_key_from_password(password+secret_key, salt)
+            decryption_key = private_key_kek(user_data[6], kek, password, salt)
             private_key_bytes = decrypt_data_gcm(encrypted_private_key, decryption_key, iv, tag)
+        except CryptoBusy:
+            raise
         except Exception as e:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             log_event("ERROR", "Key_error"+str(e), id, ip_address)
             flash("Wystąpił błąd podczas weryfikacji. Spróbuj ponownie.", "danger")
             return redirect(url_for("index"))
@@ -286,48 +339,60 @@ def render():
             backend=default_backend()
         )
 
-        rendered = markdown.markdown(md)
-        safe_rendered = bleach.clean(rendered, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
+        safe_rendered = render_markdown(md)
 
-        signature = private_key.sign(
-            safe_rendered.encode(),
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
+        signature = sign_message(private_key, safe_rendered)
         
-        add_note_to_db(username, safe_rendered, signature, ip_address)
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
+        note_id = add_note_to_db(username, safe_rendered, signature, ip_address)
+        record_verification(
+            note_id,
+            safe_rendered,
+            signature,
+            user_data[5],
+            verify_signature(private_key.public_key(), safe_rendered, signature)
+        )
         return render_template("markdown.html", rendered=safe_rendered, ip_address=ip_address)
     
-    if(time.time()-start_time<delay):
-        time.sleep(delay-(start_time-time.time()))
     return render_template("markdown.html", rendered="")
 
 
+@app.route("/preview", methods=["POST"])
+def preview():
+    if "user" not in session:
+        return jsonify({"success": False, "message": "Musisz być zalogowany, aby zobaczyć podgląd."}), 401
+
+    data = request.get_json(silent=True) or request.form
+    md = data.get("markdown", "") if isinstance(data, dict) else None
+    if not isinstance(md, str):
+        return jsonify({"success": False, "message": "Niepoprawne dane."}), 400
+    if len(md) > 1000:
+        return jsonify({"success": False, "message": "Tekst jest zbyt długi!"}), 400
+
+    # Podgląd nie wymaga hasła ani podpisu, więc nie odszyfrowuje klucza prywatnego
+    return jsonify({"success": True, "rendered": render_markdown(md)})
+
 def add_note_to_db(username, message, signature, ip_address):
     try:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO notes_of_this_app (message, author, signature, ip_address)
-                VALUES (?, ?, ?, ?)
-            ''', (message, username, sqlite3.Binary(signature), ip_address))
+                INSERT INTO notes_of_this_app (message, author, signature, ip_address, base_64, signature_b64)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (message, username, sqlite3.Binary(signature), ip_address, *encode_note(message, signature)))
             conn.commit()
+            return cursor.lastrowid
     except sqlite3.Error as e:
         raise
     
+# Zdarzenia bezpieczeństwa trafiają do bazy od razu, pozostałe przez bufor dziennika
+SECURITY_EVENTS = TRACKED_EVENTS + (
+    "LOGIN_ERROR_MAX", "TOPT_ERROR_MAX", "CHANGE_PASSWORD_ERROR_MAX", "RESET_PASSWORD_ERROR_MAX"
+)
+
 def log_event(event_type, event_details=None, user_id=None, ip_address = None):
-    with sqlite3.connect("users.db") as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO logs_of_this_app (event_type, event_details, user_id, ip_address)
-            VALUES (?, ?, ?, ?)
-        ''', (event_type, event_details, user_id, ip_address))
-        conn.commit()
+    queue_event(event_type, event_details, user_id, ip_address, sync=event_type in SECURITY_EVENTS)
+    if event_type in TRACKED_EVENTS:
+        record_failed_attempt(event_type, user_id, ip_address)
 
 
 # @app.route("/render/<rendered_id>")
@@ -341,8 +406,6 @@ def log_event(event_type, event_details=None, user_id=None, ip_address = None):
 # Strona główna z formularzem logowania
 @app.route("/", methods=["GET", "POST"])
 def index():
-    delay = 3
-    start_time = time.time()
     if request.method == "POST":
         username = request.form.get("username")
         password = request.form.get("password")
@@ -351,28 +414,11 @@ def index():
         ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
         if not username or not password or not totp_token:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Wszystkie pola są wymagane!", "danger")
             return redirect(url_for("index"))
         
-        time_window = 10 * 60
-        max_failed_attempts = 3
-
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM logs_of_this_app
-                JOIN users_of_this_app ON logs_of_this_app.user_id = users_of_this_app.id
-                WHERE logs_of_this_app.event_type = ? 
-                AND users_of_this_app.username = ? 
-                AND logs_of_this_app.timestamp > DATETIME('now', ? || ' seconds')
-            """, ("LOGIN_ERROR", username, f"-{time_window}")
-            )
-            failed_attempts = cursor.fetchone()
-            failed_attempts = failed_attempts[0]
 
             cursor.execute("""
                 SELECT id
@@ -383,78 +429,64 @@ def index():
             if user:
                 id = user[0]
             else:
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
 
-            if failed_attempts >= max_failed_attempts:
+            if too_many_attempts("LOGIN_ERROR", id, ip_address):
                 log_event("LOGIN_ERROR_MAX", "Too_many_login_errors", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Zbyt wiele nieudanych prób logowania. Spróbuj ponownie za kilka minut.", "danger")
                 return redirect(url_for("index"))
             cursor.execute("""
-                SELECT id , password, encrypted_totp_secret, totp_iv, totp_tag, topt_salt 
+                SELECT id , password, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, salt, kdf_version 
                 FROM users_of_this_app 
                 WHERE username = ?
             """, (username,))
             user = cursor.fetchone()
 
         if user:
-            id, password2, encrypted_totp_secret, totp_iv, totp_tag, topt_salt = user
+            id, password2, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, salt, kdf_version = user
 
-            if check_password_hash(password2, password):
+            if check_password(password2, kdf_version, salt, password)[0]:
                 try:
-                    encryption_key_totp = generate_key_from_password(secret_key, topt_salt)
+                    encryption_key_totp = totp_key(kdf_version, topt_salt)
                     totp_secret = decrypt_data_gcm(
                         encrypted_totp_secret,
                         encryption_key_totp,
                         totp_iv,
                         totp_tag
                     ).decode("utf-8")
+                except CryptoBusy:
+                    raise
                 except Exception as e:
                     log_event("ERROR", "Topt_error"+str(e), id, ip_address)
-                    if(time.time()-start_time<delay):
-                        time.sleep(delay-(start_time-time.time()))
                     flash("Wystąpił błąd podczas weryfikacji. Spróbuj ponownie.", "danger")
                     return redirect(url_for("index"))
 
                 totp = pyotp.TOTP(totp_secret)
                 if totp.verify(totp_token):
                     session["user"] = username
+                    if kdf_version < KDF_VERSION:
+                        upgrade_user_keys(username, password)
                     log_event("LOGGED_IN", "User_logged_in", id, ip_address)
-                    if(time.time()-start_time<delay):
-                        time.sleep(delay-(start_time-time.time()))
                     flash("Zalogowano pomyślnie!", "success") 
                     return redirect(url_for("dashboard"))
                 else:
                     log_event("LOGIN_ERROR", "Wrong_login_data", id, ip_address)
-                    if(time.time()-start_time<delay):
-                        time.sleep(delay-(start_time-time.time()))
                     flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                     return redirect(url_for("index"))
             else:
                 log_event("LOGIN_ERROR", "Wrong_login_data", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
         else:
             log_event("LOGIN_ERROR", "Wrong_login_data", None, ip_address)
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
             return redirect(url_for("index"))
         
-    if(time.time()-start_time<delay):
-        time.sleep(delay-(start_time-time.time()))
     return render_template("login.html")
 
 @app.route("/verify", methods=["POST"])
 def verify():
-    delay = 4
-    start_time = time.time()
     totp_token = request.form.get("totp_token")
     password = request.form.get("password")
     username = request.form.get("username")
@@ -462,40 +494,15 @@ def verify():
     ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
     if not totp_token or not re.match(r"^\d{6}$", totp_token):
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Podano nieprawidłowy kod TOTP. Spróbuj ponownie.", "danger")
         return redirect(url_for("index"))
     
-    time_window = 10 * 60
-    max_failed_attempts = 3
-
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
 
-        cursor.execute("""
-                SELECT COUNT(*)
-                FROM logs_of_this_app
-                JOIN users_of_this_app ON logs_of_this_app.user_id = users_of_this_app.id
-                WHERE logs_of_this_app.event_type = ? 
-                AND users_of_this_app.username = ? 
-                AND logs_of_this_app.timestamp > DATETIME('now', ? || ' seconds')
-            """, ("TOPT_ERROR", username, f"-{time_window}")
-            )
-        failed_attempts = cursor.fetchone()
-        failed_attempts = failed_attempts[0]
-
-        if failed_attempts >= max_failed_attempts:
-            log_event("TOPT_ERROR_MAX", "Too_many_topt_errors", id, ip_address)
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
-            flash("Zbyt wiele nieudanych prób. Spróbuj ponownie za kilka minut.", "danger")
-            return redirect(url_for("index"))
-
-
         cursor.execute(
             """
-            SELECT id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, password, id
+            SELECT id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, password, salt, kdf_version
             FROM users_of_this_app 
             WHERE username = ?
             """,
@@ -503,52 +510,47 @@ def verify():
         )
         user_data = cursor.fetchone()
         if not user_data:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
             return redirect(url_for("index"))
 
-    id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, password2, id = user_data
+    id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, password2, salt, kdf_version = user_data
+
+    if too_many_attempts("TOPT_ERROR", id, ip_address):
+        log_event("TOPT_ERROR_MAX", "Too_many_topt_errors", id, ip_address)
+        flash("Zbyt wiele nieudanych prób. Spróbuj ponownie za kilka minut.", "danger")
+        return redirect(url_for("index"))
 
-    if not check_password_hash(password2, password):
+    if not check_password(password2, kdf_version, salt, password)[0]:
         log_event("TOPT_ERROR", "Wrong_data_verify", id, ip_address)
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Niepoprawne hasło lub kod TOTP. Spróbuj ponownie.", "danger")
         return redirect(url_for("index"))
 
     try:
-        encryption_key_totp = generate_key_from_password(secret_key, topt_salt)
+        encryption_key_totp = totp_key(kdf_version, topt_salt)
         totp_secret = decrypt_data_gcm(
             encrypted_totp_secret,
             encryption_key_totp,
             totp_iv,
             totp_tag
         ).decode("utf-8")
+    except CryptoBusy:
+        raise
     except Exception as e:
         log_event("ERROR", "Topt_verification_error"+str(e), id, ip_address)
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Wystąpił błąd podczas weryfikacji. Spróbuj ponownie.", "danger")
         return redirect(url_for("index"))
 
     totp = pyotp.TOTP(totp_secret)
     if totp.verify(totp_token):
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         return redirect(url_for("index"))
     else:
         flash("Niepoprawny kod TOTP. Spróbuj ponownie.", "danger")
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         log_event("TOPT_ERROR", "Wrong_data_verify", id, ip_address)
         return redirect(url_for("index"))
 
 
 @app.route("/register", methods=["GET", "POST"])
 def register():
-    delay = 5
-    start_time = time.time()
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
@@ -557,75 +559,41 @@ def register():
         ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
         if len(username) < 4:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Nazwa użytkownika musi mieć co najmniej 4 znaki.", "danger")
             return redirect(url_for("register"))
 
         if not re.match("^[a-zA-Z0-9]+$", username):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Nazwa użytkownika może zawierać tylko wielkie i małe litery oraz cyfry.", "danger")
             return redirect(url_for("register"))
 
         if len(password) < 10:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi mieć co najmniej 10 znaków.", "danger")
             return redirect(url_for("register"))
 
         if not re.search(r'[A-Z]', password):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi zawierać co najmniej jedną wielką literę.", "danger")
             return redirect(url_for("register"))
 
         if not re.search(r'[a-z]', password):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi zawierać co najmniej jedną małą literę.", "danger")
             return redirect(url_for("register"))
 
         if not re.search(r'\d', password):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi zawierać co najmniej jedną cyfrę.", "danger")
             return redirect(url_for("register"))
 
         if not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi zawierać co najmniej jeden znak specjalny (!@#$%^&*(),.?\":{}|<>).", "danger")
             return redirect(url_for("register"))
 
         if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Podano nieprawidłowy adres email.", "danger")
             return redirect(url_for("register"))
 
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256:300000', salt_length=16)
         try: 
-            private_key = rsa.generate_private_key(
-                public_exponent=65537,
-                key_size=2048,
-                backend=default_backend()
-            )
-            public_key = private_key.public_key()
-
-            private_key_bytes = private_key.private_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-
-            public_key_bytes = public_key.public_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PublicFormat.SubjectPublicKeyInfo
-            )
+            private_key_bytes, public_key_bytes = take_keypair()
 
-            salt = os.urandom(16)
-            encryption_key = generate_key_from_password(password+secret_key, salt)
+            hashed_password, salt, encryption_key = new_password_keys(password)
             encrypted_private_key, iv, tag = encrypt_data_gcm(private_key_bytes, encryption_key)
 
             totp_secret = pyotp.random_base32()
@@ -637,19 +605,17 @@ def register():
             qr_image.save(buffered, format="PNG")
             qr_code_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
 
-            salt_topt = os.urandom(16)
-            encryption_key_totp = generate_key_from_password(secret_key, salt_topt)
-            cipher_totp_secret, totp_iv, totp_tag = encrypt_data_gcm(totp_secret.encode(), encryption_key_totp)
+            cipher_totp_secret, totp_iv, totp_tag, salt_topt = encrypt_totp_secret(totp_secret)
+        except CryptoBusy:
+            raise
         except Exception as e:
             log_event("ERROR", "Registration_error"+str(e), None, ip_address)
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Wystąpił błąd podczas weryfikacji. Spróbuj ponownie.", "danger")
             return redirect(url_for("index"))
             
 
         try:
-            with sqlite3.connect("users.db") as conn:
+            with get_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -666,9 +632,10 @@ def register():
                         encrypted_totp_secret, 
                         totp_iv, 
                         totp_tag, 
-                        topt_salt
+                        topt_salt,
+                        kdf_version
                     )
-                    VALUES (?, datetime('now'), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    VALUES (?, datetime('now'), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """,
                     (
                         username,
@@ -682,223 +649,175 @@ def register():
                         cipher_totp_secret, 
                         totp_iv, 
                         totp_tag, 
-                        salt_topt
+                        salt_topt,
+                        KDF_VERSION
                     )
                 )
                 conn.commit()
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Rejestracja zakończona sukcesem!", "success")
                 log_event("REGISTRATION_SUCCESS", "Registration_success", None, ip_address)
                 return render_template("two_factor.html", qr_code_base64=qr_code_base64)
         except sqlite3.IntegrityError:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Użytkownik o podanej nazwie lub adresie email już istnieje!", "danger")
             return redirect(url_for("index"))
         
-    if(time.time()-start_time<delay):
-        time.sleep(delay-(start_time-time.time()))
     return render_template("register.html")
 
 
+def dashboard_notes(username, before, page, user_ip_address):
+    """Pobiera i weryfikuje notatki tablicy porcjami; po ostatniej porcji ustawia kursor następnej strony"""
+    remaining = app.config["FEED_PAGE_SIZE"]
+    chunk = app.config["DASHBOARD_STREAM_CHUNK"] if app.config["DASHBOARD_STREAMING"] else remaining
+    next_cursor = None
+    # Klucz autora trafia na stronę raz, przy jego pierwszej notatce; kolejne odwołują się do niego przez key_id
+    sent_keys = set()
+    while remaining > 0:
+        feed, next_cursor = fetch_feed(username, before=before, limit=min(chunk, remaining))
+        remaining -= len(feed)
+        verifiable = []
+        for note in feed:
+            if note["public_key"] is None:
+                log_event("ERROR", "Missing note author", None, note["ip_address"])
+                continue
+            verifiable.append((note, *get_author_key(note["author"], note["public_key"])))
+
+        # Podpisy całej porcji spoza rejestru są sprawdzane równolegle; strumieniowana strona ma już wysłane nagłówki,
+        # więc przy pełnej puli zamiast 503 pomija notatki, których nie dało się sprawdzić
+        results = check_notes([note for note, _, _ in verifiable], [key for _, key, _ in verifiable],
+                              skip_busy=app.config["DASHBOARD_STREAMING"])
+        for (note, public_key, public_key_pem), valid in zip(verifiable, results):
+            if valid is None:
+                page["unverified"] += 1
+                continue
+            if not valid:
+                log_event("ERROR", "Loading_messages_error", note["author_id"], user_ip_address)
+                continue
+
+            key_id = note["author_id"]
+            yield {
+                "id": note["id"],
+                "key_id": key_id,
+                "public_key": None if key_id in sent_keys else public_key_pem,
+                "message": note["message"],
+                "author": note["author"],
+                "created_at": note["created_at"],
+                "signature": note["signature_b64"],
+                "ip_address": note["ip_address"],
+                "base_64": note["base_64"],
+                "likes": note["likes"],
+                "user_liked": note["user_liked"],
+                "pending": note["pending"]
+            }
+            sent_keys.add(key_id)
+        if next_cursor is None:
+            break
+        before = next_cursor
+    page["next_cursor"] = next_cursor
+    if page["unverified"]:
+        mark_incomplete(page["etag"])
+    log_event("NOTES_LOADED", "Notes_loaded", None, user_ip_address)
+
 @app.route("/dashboard", methods=["GET", "POST"])
 def dashboard():
 
-    delay = 5
-    start_time = time.time()
-
     user_ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
     if "user" in session:
         username = session['user']
 
-        notes = []
+        etag, last_modified = page_validators()
+        cached = not_modified(etag, last_modified)
+        if cached is not None:
+            return cached
 
-        with sqlite3.connect("users.db") as conn:
-            cursor = conn.cursor()
-            
-            # Pobierz user_id zalogowanego użytkownika
-            cursor.execute("SELECT id FROM users_of_this_app WHERE username = ?", (username,))
-            current_user = cursor.fetchone()
-            current_user_id = current_user[0] if current_user else None
-            
-            cursor.execute(
-                """
-                SELECT message, created_at, signature, ip_address, author, id 
-                FROM notes_of_this_app 
-                ORDER BY created_at DESC
-                """
-            )
-            user_notes = cursor.fetchall()
-            for note in user_notes:
-                message, created_at, signature, ip_address, author, note_id = note
-                base_64 = base64.b64encode(message.encode('utf-8')).decode('utf-8')
+        page = {"next_cursor": None, "unverified": 0, "etag": etag}
+        notes = dashboard_notes(username, parse_feed_cursor(request.args), page, user_ip_address)
 
-                cursor.execute(
-                    """
-                    SELECT id, public_key 
-                    FROM users_of_this_app 
-                    WHERE username = ?
-                    """, 
-                    (author,)
-                )
-                author_data = cursor.fetchone()
-                if not author_data:
-                    log_event("ERROR", "Missing note author", None, ip_address)
-                    continue
-
-                id, public_key_bytes = author_data
-                public_key = serialization.load_pem_public_key(
-                    public_key_bytes,
-                    backend=default_backend()
-                )
-
-                try:
-                    signature_bytes = signature
-                    public_key.verify(
-                        signature_bytes,
-                        message.encode(),
-                        padding.PSS(
-                            mgf=padding.MGF1(hashes.SHA256()),
-                            salt_length=padding.PSS.MAX_LENGTH
-                        ),
-                        hashes.SHA256()
-                    )
-                    public_key = public_key.public_bytes(
-                        encoding=serialization.Encoding.PEM,
-                        format=serialization.PublicFormat.SubjectPublicKeyInfo
-                    )
-                    public_key = public_key.decode('utf-8')
+        if not app.config["DASHBOARD_STREAMING"]:
+            notes = list(notes)
+            return with_validators(
+                render_template("hello.html", username=username, notes=notes, page=page),
+                etag,
+                last_modified
+            )
 
-                    signature = base64.b64encode(signature).decode('utf-8')
-                    
-                    # Pobierz liczbę lajków dla notatki
-                    cursor.execute("SELECT COUNT(*) FROM likes_of_this_app WHERE note_id = ?", (note_id,))
-                    like_count = cursor.fetchone()[0]
-                    
-                    # Sprawdź czy zalogowany użytkownik polubił tę notatkę
-                    user_liked = False
-                    if current_user_id:
-                        cursor.execute(
-                            "SELECT id FROM likes_of_this_app WHERE note_id = ? AND user_id = ?",
-                            (note_id, current_user_id)
-                        )
-                        user_liked = cursor.fetchone() is not None
-
-                    notes.append({
-                    "id": note_id,
-                    "public_key": public_key,
-                    "message": message,
-                    "author": author,
-                    "created_at": created_at,
-                    "signature": signature,
-                    "ip_address": ip_address,
-                    "base_64": base_64,
-                    "likes": like_count,
-                    "user_liked": user_liked
-                })
-                except Exception as e:
-                    log_event("ERROR", "Loading_messages_error"+str(e), id, user_ip_address)
-        log_event("NOTES_LOADED", "Notes_loaded", None, user_ip_address)
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
-        return render_template("hello.html", username=username, notes=notes)
+        # Po rozpoczęciu strumienia 503 nie jest już możliwe, więc pełną pulę odrzucamy przed nim
+        if crypto.busy():
+            raise CryptoBusy("rsa_verify")
+        # Padding dopełnia czas trasy dopiero po wysłaniu całej strony, by nie opóźniać pierwszych notatek
+        request.environ["app.padding.streamed"] = True
+        # Ciasteczko sesji wychodzi przed treścią, więc komunikaty trzeba zużyć przed strumieniowaniem szablonu
+        get_flashed_messages(with_categories=True)
+        return with_validators(
+            stream_template("hello.html", username=username, notes=notes, page=page),
+            etag,
+            last_modified
+        )
     else:
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Musisz być zalogowany, aby zobaczyć tę stronę.", "warning")
         log_event("ERROR", "Someone_not_logged", None, user_ip_address)
         return redirect(url_for("index"))
     
 @app.route("/page/<user>")
 def user_page(user):
-    delay = 3
-    start_time = time.time()
 
     user_ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
     if "user" in session:
-        with sqlite3.connect("users.db") as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT message, created_at, signature, ip_address, author 
-                FROM notes_of_this_app
-                WHERE author = ?
-                """, 
-                (user,)
-            )
-            user_notes = cursor.fetchall()
+        etag, last_modified = page_validators(author=user)
+        cached = not_modified(etag, last_modified)
+        if cached is not None:
+            return cached
+
         notes = []
-        for note in user_notes:
-            message, created_at, signature, ip_address, author = note
+        id = None
+        feed, next_cursor = fetch_feed(
+            session["user"],
+            author=user,
+            before=parse_feed_cursor(request.args),
+            limit=app.config["FEED_PAGE_SIZE"]
+        )
+        verifiable = []
+        sent_keys = set()
+        for note in feed:
+            if note["public_key"] is None:
+                continue
+            id = note["author_id"]
+            verifiable.append((note, *get_author_key(note["author"], note["public_key"])))
 
-            cursor.execute(
-                 """
-                SELECT id, public_key 
-                FROM users_of_this_app 
-                WHERE username = ?
-                """, 
-                (author,)
-            )
-            author_data = cursor.fetchone()
-            if not author_data:
+        results = check_notes([note for note, _, _ in verifiable], [key for _, key, _ in verifiable])
+        for (note, public_key, public_key_pem), valid in zip(verifiable, results):
+            if not valid:
+                log_event("ERROR", "Loading_messages_error", note["author_id"], note["ip_address"])
                 continue
-            id, public_key_bytes = author_data
-            public_key = serialization.load_pem_public_key(
-                public_key_bytes,
-                backend=default_backend()
-            )
 
-            try:
-                signature_bytes = signature
-                public_key.verify(
-                    signature_bytes,
-                    message.encode(),
-                    padding.PSS(
-                        mgf=padding.MGF1(hashes.SHA256()),
-                            salt_length=padding.PSS.MAX_LENGTH
-                    ),
-                    hashes.SHA256()
-                )
-                public_key = public_key.public_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PublicFormat.SubjectPublicKeyInfo
-                )
-                public_key = public_key.decode('utf-8')
-
-                signature = base64.b64encode(signature).decode('utf-8')
-                message = bleach.clean(message, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
-                base_64 = base64.b64encode(message.encode('utf-8')).decode('utf-8')
-
-                notes.append({
-                    "base_64":base_64,
-                    "public_key": public_key,
-                    "message": message,
-                    "author": author,
-                    "created_at": created_at,
-                    "signature": signature,
-                    "ip_address": ip_address
+            key_id = note["author_id"]
+            notes.append({
+                "base_64": note["base_64"],
+                "key_id": key_id,
+                "public_key": None if key_id in sent_keys else public_key_pem,
+                "message": note["message"],
+                "author": note["author"],
+                "created_at": note["created_at"],
+                "signature": note["signature_b64"],
+                "ip_address": note["ip_address"],
+                "pending": note["pending"]
             })
-            except Exception as e:
-                log_event("ERROR", "Loading_messages_error"+str(e), id, ip_address)
+            sent_keys.add(key_id)
 
         log_event("NOTES_LOADED", "Notes_loaded", id, user_ip_address)
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
-        return render_template("user_page.html",user=author, notes=notes)
+        return with_validators(
+            render_template("user_page.html",user=user, notes=notes, next_cursor=next_cursor),
+            etag,
+            last_modified
+        )
     else:
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Musisz być zalogowany, aby zobaczyć tę stronę.", "warning")
         log_event("ERROR", "Someone_not_logged", None , user_ip_address)
         return redirect(url_for("index"))
 
 @app.route("/change_password", methods=["GET", "POST"])
 def change_password():
-    delay = 5
-    start_time = time.time()
 
     ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
@@ -910,28 +829,11 @@ def change_password():
         
 
         if not username or not password or not totp_token:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Wszystkie pola są wymagane!", "danger")
             return redirect(url_for("index"))
         
-        time_window = 10 * 60
-        max_failed_attempts = 3
-
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM logs_of_this_app
-                JOIN users_of_this_app ON logs_of_this_app.user_id = users_of_this_app.id
-                WHERE logs_of_this_app.event_type = ? 
-                AND users_of_this_app.username = ? 
-                AND logs_of_this_app.timestamp > DATETIME('now', ? || ' seconds')
-            """, ("CHANGE_PASSWORD_ERROR", username, f"-{time_window}")
-            )
-            failed_attempts = cursor.fetchone()
-            failed_attempts = failed_attempts[0]
 
             cursor.execute("""
                 SELECT id
@@ -942,40 +844,36 @@ def change_password():
             if user:
                 id = user[0]
             else:
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
 
-            if failed_attempts >= max_failed_attempts:
+            if too_many_attempts("CHANGE_PASSWORD_ERROR", id, ip_address):
                 log_event("CHANGE_PASSWORD_ERROR_MAX", "Too_many_change_password_errors", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Zbyt wiele nieudanych prób. Spróbuj ponownie za kilka minut.", "danger")
                 return redirect(url_for("index"))
             cursor.execute("""
-                SELECT id , password, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, email 
+                SELECT id , password, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, email, salt, kdf_version 
                 FROM users_of_this_app 
                 WHERE username = ?
             """, (username,))
             user = cursor.fetchone()
 
         if user:
-            id, password2, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, email = user
+            id, password2, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, email, salt, kdf_version = user
 
-            if check_password_hash(password2, password):
+            if check_password(password2, kdf_version, salt, password)[0]:
                 try:
-                    encryption_key_totp = generate_key_from_password(secret_key, topt_salt)
+                    encryption_key_totp = totp_key(kdf_version, topt_salt)
                     totp_secret = decrypt_data_gcm(
                         encrypted_totp_secret,
                         encryption_key_totp,
                         totp_iv,
                         totp_tag
                     ).decode("utf-8")
+                except CryptoBusy:
+                    raise
                 except Exception:
                     log_event("ERROR", "Topt_verification_error", id, ip_address)
-                    if(time.time()-start_time<delay):
-                        time.sleep(delay-(start_time-time.time()))
                     flash("Wystąpił błąd podczas weryfikacji. Spróbuj ponownie.", "danger")
                     return redirect(url_for("index"))
 
@@ -984,7 +882,7 @@ def change_password():
                     salt = os.urandom(16)
                     change_token = serializer.dumps(email, salt=salt)
                     print("Wysyłam taki token: "+ str(change_token)+" na taki adres "+str(email))
-                    with sqlite3.connect("users.db") as conn:
+                    with get_db() as conn:
                         cursor = conn.cursor()
                         cursor.execute("""
                             UPDATE users_of_this_app 
@@ -995,31 +893,21 @@ def change_password():
                     return render_template("change_verify.html")
                 else:
                     log_event("CHANGE_PASSWORD_ERROR", "Wrong_data_change_password", id, ip_address)
-                    if(time.time()-start_time<delay):
-                        time.sleep(delay-(start_time-time.time()))
                     flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                     return redirect(url_for("index"))
             else:
                 log_event("CHANGE_PASSWORD_ERROR", "Wrong_data_change_password", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
         else:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
             return redirect(url_for("index"))
         
 
-    if(time.time()-start_time<delay):
-        time.sleep(delay-(start_time-time.time()))
     return render_template("change.html")
 
 @app.route("/change_verify", methods=["POST"])
 def change_verify():
-    delay = 4
-    start_time = time.time()
     reset_token = request.form.get("reset_token")
     totp_token = request.form.get("totp")
     password = request.form.get("password")
@@ -1029,58 +917,31 @@ def change_verify():
     ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
     if not username or not password or not totp_token or not reset_token or not new_password:
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Wszystkie pola są wymagane!", "danger")
         return render_template("change_verify.html")
     
     if len(new_password) < 10:
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Hasło musi mieć co najmniej 10 znaków.", "danger")
         return render_template("change_verify.html")
 
     if not re.search(r'[A-Z]', new_password):
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Hasło musi zawierać co najmniej jedną wielką literę.", "danger")
         return render_template("change_verify.html")
 
     if not re.search(r'[a-z]', new_password):
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Hasło musi zawierać co najmniej jedną małą literę.", "danger")
         return render_template("change_verify.html")
 
     if not re.search(r'\d', new_password):
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Hasło musi zawierać co najmniej jedną cyfrę.", "danger")
         return render_template("change_verify.html")
 
     if not re.search(r'[!@#$%^&*(),.?":{}|<>]', new_password):
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Hasło musi zawierać co najmniej jeden znak specjalny (!@#$%^&*(),.?\":{}|<>).", "danger")
         return render_template("change_verify.html")
 
-    time_window = 10 * 60
-    max_failed_attempts = 3
-
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM logs_of_this_app
-            JOIN users_of_this_app ON logs_of_this_app.user_id = users_of_this_app.id
-            WHERE logs_of_this_app.event_type = ? 
-            AND users_of_this_app.username = ? 
-            AND logs_of_this_app.timestamp > DATETIME('now', ? || ' seconds')
-        """, ("CHANGE_PASSWORD_ERROR", username, f"-{time_window}")
-        )
-        failed_attempts = cursor.fetchone()
-        failed_attempts = failed_attempts[0]
 
         cursor.execute("""
             SELECT id
@@ -1093,35 +954,34 @@ def change_verify():
         else:
             id = None
 
-        if failed_attempts >= max_failed_attempts:
+        if too_many_attempts("CHANGE_PASSWORD_ERROR", id, ip_address):
             log_event("CHANGE_PASSWORD_ERROR_MAX", "Too_many_change_password_errors", id, ip_address)
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Zbyt wiele nieudanych prób. Spróbuj ponownie za kilka minut.", "danger")
             return redirect(url_for("index"))
         cursor.execute("""
-            SELECT id , password, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, reset_password_salt, email
+            SELECT id , password, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, reset_password_salt, email, salt, kdf_version
             FROM users_of_this_app 
             WHERE username = ?
         """, (username,))
         user = cursor.fetchone()
 
     if user:
-        id, password2, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, reset_password_salt, email = user
+        id, password2, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, reset_password_salt, email, salt, kdf_version = user
 
-        if check_password_hash(password2, password):
+        password_ok, kek = check_password(password2, kdf_version, salt, password)
+        if password_ok:
             try:
-                encryption_key_totp = generate_key_from_password(secret_key, topt_salt)
+                encryption_key_totp = totp_key(kdf_version, topt_salt)
                 totp_secret = decrypt_data_gcm(
                     encrypted_totp_secret,
                     encryption_key_totp,
                     totp_iv,
                     totp_tag
                 ).decode("utf-8")
+            except CryptoBusy:
+                raise
             except Exception as e:
                 log_event("ERROR", "Topt_verification_error"+str(e), id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Wystąpił błąd podczas weryfikacji. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
 
@@ -1136,11 +996,11 @@ def change_verify():
 
                         encrypted_private_key, iv, tag, salt = user_data[0], user_data[1], user_data[2], user_data[3]
                         try:
-                            decryption_key = generate_key_from_password(password + secret_key, salt)
+                            decryption_key = private_key_kek(kdf_version, kek, password, salt)
                             private_key_bytes = decrypt_data_gcm(encrypted_private_key, decryption_key, iv, tag)
+                        except CryptoBusy:
+                            raise
                         except Exception as e:
-                            if(time.time()-start_time<delay):
-                                time.sleep(delay-(start_time-time.time()))
                             flash("Błąd podczas odszyfrowywania klucza prywatnego.", "danger")
                             return redirect(url_for("index"))
 
@@ -1156,62 +1016,50 @@ def change_verify():
                             encryption_algorithm=serialization.NoEncryption()
                         )
 
-                        salt = os.urandom(16)
-
-                        encryption_key = generate_key_from_password(new_password + secret_key, salt)
+                        hashed_password, salt, encryption_key = new_password_keys(new_password)
                         encrypted_private_key, iv, tag = encrypt_data_gcm(private_key_bytes_to_encrypt, encryption_key)
+                        cipher_totp_secret, totp_iv, totp_tag, topt_salt = encrypt_totp_secret(totp_secret)
+                        wrapped_key = wrap_job_key(private_key_bytes)
 
-                        hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256:300000', salt_length=16)
-
-                        with sqlite3.connect("users.db") as conn:
+                        with get_db() as conn:
                             cursor = conn.cursor()
                             cursor.execute("""
                                 UPDATE users_of_this_app 
-                                SET password = ?, private_key = ?, salt = ?, iv = ?, tag = ?
+                                SET password = ?, private_key = ?, salt = ?, iv = ?, tag = ?,
+                                    encrypted_totp_secret = ?, totp_iv = ?, totp_tag = ?, topt_salt = ?, kdf_version = ?
                                 WHERE username = ?
-                            """, (hashed_password, encrypted_private_key, salt, iv, tag, username))
+                            """, (hashed_password, encrypted_private_key, salt, iv, tag,
+                                  cipher_totp_secret, totp_iv, totp_tag, topt_salt, KDF_VERSION, username))
                             conn.commit()
 
                         flash("Hasło zmienione", "success")
-                        if(time.time()-start_time<delay):
-                            time.sleep(delay-(start_time-time.time()))
                         return redirect(url_for("index"))
                     else:
                         log_event("CHANGE_PASSWORD_ERROR", "Wrong_data_change_password", id, ip_address)
-                        if(time.time()-start_time<delay):
-                            time.sleep(delay-(start_time-time.time()))
                         flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                         return redirect(url_for("index"))
                     
+                except CryptoBusy:
+                    raise
                 except Exception as e:
                     log_event("ERROR", "Unexpected_error_change_password "+str(e), id, ip_address)
-                    if(time.time()-start_time<delay):
-                        time.sleep(delay-(start_time-time.time()))
                     flash("Wystąpił nieoczekiwany błąd. Spróbuj ponownie.", "danger")
                     return redirect(url_for("index"))
             else:
                 log_event("CHANGE_PASSWORD_ERROR", "Wrong_data_change_password", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
         else:
             log_event("CHANGE_PASSWORD_ERROR", "Wrong_data_change_password", id, ip_address)
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
             return redirect(url_for("index"))
     else:
-        if(time.time()-start_time<delay):
-            time.sleep(delay-(start_time-time.time()))
         flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
         return redirect(url_for("index"))
     
 
 @app.route("/reset_password", methods=["GET", "POST"])
 def reset_password():
-    delay = 5
-    start_time = time.time()
     if request.method == "POST":
         username = request.form["username"]
         totp_token = request.form["totp"]
@@ -1219,28 +1067,11 @@ def reset_password():
         ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
         if not username or not totp_token:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Wszystkie pola są wymagane!", "danger")
             return redirect(url_for("index"))
         
-        time_window = 10 * 60
-        max_failed_attempts = 3
-
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM logs_of_this_app
-                JOIN users_of_this_app ON logs_of_this_app.user_id = users_of_this_app.id
-                WHERE logs_of_this_app.event_type = ? 
-                AND users_of_this_app.username = ? 
-                AND logs_of_this_app.timestamp > DATETIME('now', ? || ' seconds')
-            """, ("RESET_PASSWORD_ERROR", username, f"-{time_window}")
-            )
-            failed_attempts = cursor.fetchone()
-            failed_attempts = failed_attempts[0]
 
             cursor.execute("""
                 SELECT id
@@ -1251,38 +1082,34 @@ def reset_password():
             if user:
                 id = user[0]
             else:
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
 
-            if failed_attempts >= max_failed_attempts:
+            if too_many_attempts("RESET_PASSWORD_ERROR", id, ip_address):
                 log_event("RESET_PASSWORD_ERROR_MAX", "Too_many_reset_password_errors", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Zbyt wiele nieudanych prób. Spróbuj ponownie za kilka minut.", "danger")
                 return redirect(url_for("index"))
             cursor.execute("""
-                SELECT id , encrypted_totp_secret, totp_iv, totp_tag, topt_salt, email 
+                SELECT id , encrypted_totp_secret, totp_iv, totp_tag, topt_salt, email, kdf_version 
                 FROM users_of_this_app 
                 WHERE username = ?
             """, (username,))
             user = cursor.fetchone()
 
         if user:
-            id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, email = user
+            id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, email, kdf_version = user
             try:
-                encryption_key_totp = generate_key_from_password(secret_key, topt_salt)
+                encryption_key_totp = totp_key(kdf_version, topt_salt)
                 totp_secret = decrypt_data_gcm(
                     encrypted_totp_secret,
                     encryption_key_totp,
                     totp_iv,
                     totp_tag
                 ).decode("utf-8")
+            except CryptoBusy:
+                raise
             except Exception:
                 log_event("ERROR", "Topt_verification_error", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Wystąpił błąd podczas weryfikacji. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
 
@@ -1291,7 +1118,7 @@ def reset_password():
                 salt = os.urandom(16)
                 change_token = serializer.dumps(email, salt=salt)
                 print("Wysyłam taki token: "+ str(change_token)+" na taki adres "+str(email)+" z takim linkiem: /reset_verify/"+str(change_token))
-                with sqlite3.connect("users.db") as conn:
+                with get_db() as conn:
                     cursor = conn.cursor()
                     cursor.execute("""
                             UPDATE users_of_this_app 
@@ -1299,30 +1126,20 @@ def reset_password():
                             WHERE username = ?
                         """, (change_token, salt, username))
                     conn.commit()
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Wysłano link do zmiany hasła na maila", "success")
                 return redirect(url_for("index"))
             else:
                 log_event("RESET_PASSWORD_ERROR", "Wrong_data_change_password", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
         else:
-            if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
             flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
             return redirect(url_for("index"))
-    if(time.time()-start_time<delay):
-        time.sleep(delay-(start_time-time.time()))
     return render_template("reset.html")
 
 
 @app.route("/reset_verify/<change_token>", methods=['GET', 'POST'])
 def reset_verify(change_token):
-    delay = 3
-    start_time = time.time()
     if request.method == "POST":
         reset_token = request.form.get("reset_token")
         totp_token = request.form.get("totp")
@@ -1332,58 +1149,31 @@ def reset_verify(change_token):
         ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
         if not username or not totp_token or not reset_token or not new_password:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Wszystkie pola są wymagane!", "danger")
             return redirect(url_for("index"))
         
         if len(new_password) < 10:
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi mieć co najmniej 10 znaków.", "danger")
             return redirect(url_for("index"))
 
         if not re.search(r'[A-Z]', new_password):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi zawierać co najmniej jedną wielką literę.", "danger")
             return redirect(url_for("index"))
 
         if not re.search(r'[a-z]', new_password):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi zawierać co najmniej jedną małą literę.", "danger")
             return redirect(url_for("index"))
 
         if not re.search(r'\d', new_password):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi zawierać co najmniej jedną cyfrę.", "danger")
             return redirect(url_for("index"))
 
         if not re.search(r'[!@#$%^&*(),.?":{}|<>]', new_password):
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Hasło musi zawierać co najmniej jeden znak specjalny (!@#$%^&*(),.?\":{}|<>).", "danger")
             return redirect(url_for("index"))
 
-        time_window = 10 * 60
-        max_failed_attempts = 3
-
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM logs_of_this_app
-                JOIN users_of_this_app ON logs_of_this_app.user_id = users_of_this_app.id
-                WHERE logs_of_this_app.event_type = ? 
-                AND users_of_this_app.username = ? 
-                AND logs_of_this_app.timestamp > DATETIME('now', ? || ' seconds')
-            """, ("RESET_PASSWORD_ERROR", username, f"-{time_window}")
-            )
-            failed_attempts = cursor.fetchone()
-            failed_attempts = failed_attempts[0]
 
             cursor.execute("""
                 SELECT id
@@ -1394,39 +1184,35 @@ def reset_verify(change_token):
             if user:
                 id = user[0]
             else:
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
 
-            if failed_attempts >= max_failed_attempts:
+            if too_many_attempts("RESET_PASSWORD_ERROR", id, ip_address):
                 log_event("RESET_PASSWORD_ERROR_MAX", "Too_many_change_password_errors", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Zbyt wiele nieudanych prób. Spróbuj ponownie za kilka minut.", "danger")
                 return redirect(url_for("index"))
             cursor.execute("""
-                SELECT id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, reset_password_salt, email
+                SELECT id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, reset_password_salt, email, kdf_version
                 FROM users_of_this_app 
                 WHERE username = ?
             """, (username,))
             user = cursor.fetchone()
 
         if user:
-            id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, reset_password_salt, email = user
+            id, encrypted_totp_secret, totp_iv, totp_tag, topt_salt, reset_password_salt, email, kdf_version = user
 
             try:
-                encryption_key_totp = generate_key_from_password(secret_key, topt_salt)
+                encryption_key_totp = totp_key(kdf_version, topt_salt)
                 totp_secret = decrypt_data_gcm(
                     encrypted_totp_secret,
                     encryption_key_totp,
                     totp_iv,
                     totp_tag
                 ).decode("utf-8")
+            except CryptoBusy:
+                raise
             except Exception as e:
                 log_event("ERROR", "Topt_verification_error"+str(e), id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Wystąpił błąd podczas weryfikacji. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
 
@@ -1436,108 +1222,56 @@ def reset_verify(change_token):
                     what = serializer.loads(reset_token, salt=reset_password_salt, max_age=600)
 
                     if email == what:
-                        private_key = rsa.generate_private_key(
-                        public_exponent=65537,
-                        key_size=2048,
-                        backend=default_backend()
-                        )
-                        public_key = private_key.public_key()
-
-                        private_key_bytes = private_key.private_bytes(
-                            encoding=serialization.Encoding.PEM,
-                            format=serialization.PrivateFormat.PKCS8,
-                            encryption_algorithm=serialization.NoEncryption()
-                        )
+                        private_key_bytes, public_key_bytes = take_keypair()
 
-                        public_key_bytes = public_key.public_bytes(
-                            encoding=serialization.Encoding.PEM,
-                            format=serialization.PublicFormat.SubjectPublicKeyInfo
-                        )
-
-                        salt = os.urandom(16)
-                        encryption_key = generate_key_from_password(new_password+secret_key, salt)
+                        hashed_password, salt, encryption_key = new_password_keys(new_password)
                         encrypted_private_key, iv, tag = encrypt_data_gcm(private_key_bytes, encryption_key)
+                        cipher_totp_secret, totp_iv, totp_tag, topt_salt = encrypt_totp_secret(totp_secret)
+                        wrapped_key = wrap_job_key(private_key_bytes)
 
-                        hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256:300000', salt_length=16)
-
-                        with sqlite3.connect("users.db") as conn:
+                        with get_db() as conn:
                             cursor = conn.cursor()
                             cursor.execute("""
                                 UPDATE users_of_this_app 
-                                SET password = ?, public_key = ?, private_key = ?, salt = ?, iv = ?, tag = ? 
+                                SET password = ?, public_key = ?, private_key = ?, salt = ?, iv = ?, tag = ?,
+                                    encrypted_totp_secret = ?, totp_iv = ?, totp_tag = ?, topt_salt = ?, kdf_version = ?
                                 WHERE username = ?
-                            """, (hashed_password, public_key_bytes, encrypted_private_key, salt, iv, tag, username))
-                            conn.commit()
-
-                            cursor.execute(
-                                """
-                                SELECT id, message
-                                FROM notes_of_this_app
-                                WHERE author = ?
-                                """, 
-                                (username,)
-                            )
-                            user_notes = cursor.fetchall()
-                            for note in user_notes:
-                                note_id, message = note
-                                safe_message = bleach.clean(message, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
-
-                                signature = private_key.sign(
-                                    safe_message.encode(),
-                                    padding.PSS(
-                                        mgf=padding.MGF1(hashes.SHA256()),
-                                        salt_length=padding.PSS.MAX_LENGTH
-                                    ),
-                                    hashes.SHA256()
-                                )
-                                cursor.execute("""
-                                UPDATE notes_of_this_app 
-                                SET message = ?, signature = ? 
-                                WHERE id = ?
-                                """, (safe_message, signature, note_id))
+                            """, (hashed_password, public_key_bytes, encrypted_private_key, salt, iv, tag,
+                                  cipher_totp_secret, totp_iv, totp_tag, topt_salt, KDF_VERSION, username))
+                            # Notatki są podpisywane nowym kluczem w tle; do tego czasu czekają na ponowną weryfikację
+                            queue_resign_job(cursor, username, wrapped_key)
                             conn.commit()
+                        invalidate_author_key(username)
+                        start_resign_jobs()
 
-                        if(time.time()-start_time<delay):
-                            time.sleep(delay-(start_time-time.time()))
                         flash("Hasło zmienione", "success")
                         return redirect(url_for("index"))
                     else:
                         log_event("RESET_PASSWORD_ERROR", "Wrong_data_change_password", id, ip_address)
-                        if(time.time()-start_time<delay):
-                            time.sleep(delay-(start_time-time.time()))
                         flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                         return redirect(url_for("index"))
 
+                except CryptoBusy:
+                    raise
                 except Exception as e:
                     log_event("ERROR", "Unexpected_error_change_password "+str(e), id, ip_address)
-                    if(time.time()-start_time<delay):
-                        time.sleep(delay-(start_time-time.time()))
                     flash("Wystąpił nieoczekiwany błąd. Spróbuj ponownie.", "danger")
                     return redirect(url_for("index"))
             else:
                 log_event("RESET_PASSWORD_ERROR", "Wrong_data_change_password", id, ip_address)
-                if(time.time()-start_time<delay):
-                    time.sleep(delay-(start_time-time.time()))
                 flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
                 return redirect(url_for("index"))
         else:
             log_event("RESET_PASSWORD_ERROR", "Wrong_data_change_password", id, ip_address)
-            if(time.time()-start_time<delay):
-                time.sleep(delay-(start_time-time.time()))
             flash("Niepoprawne dane. Spróbuj ponownie.", "danger")
             return redirect(url_for("index"))
         
 
-    if(time.time()-start_time<delay):
-        time.sleep(delay-(start_time-time.time()))
     return render_template("reset_verify.html")
 
 @app.route("/logout", methods=["POST"])
 def logout():
-    start_time = time.time()
     session.pop("user", None)
-    if(time.time()-start_time<1):
-        time.sleep(1-(start_time-time.time()))
     flash("Wylogowano pomyślnie.", "success")
     return redirect(url_for("index"))
 
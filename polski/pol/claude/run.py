@@ -1,4 +1,17 @@
+import os
+
+# Pod gevent wyrównywanie czasu odpowiedzi usypia tylko greenlet żądania, a nie cały wątek serwera
+USE_GEVENT = os.getenv("USE_GEVENT", "1") != "0"
+
+if USE_GEVENT:
+    from gevent import monkey
+    monkey.patch_all()
+
 from app import app
 
 if __name__ == "__main__":
-    app.run(debug = True)
\ No newline at end of file
+    if USE_GEVENT:
+        from gevent.pywsgi import WSGIServer
+        WSGIServer(("127.0.0.1", int(os.getenv("PORT", 5000))), app).serve_forever()
+    else:
+        app.run(debug = True)
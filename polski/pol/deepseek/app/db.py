@@ -0,0 +1,161 @@
+from app import app
+from flask import g, has_app_context
+import sqlite3
+import queue
+import threading
+import time
+
+app.config.setdefault("DATABASE", "users.db")
+app.config.setdefault("DB_POOL_SIZE", 8)
+app.config.setdefault("DB_BUSY_TIMEOUT", 5000)
+app.config.setdefault("DB_STATS_HEADERS", False)
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 67108864",
+)
+
+_pool = queue.LifoQueue()
+_pool_lock = threading.Lock()
+_pool_stats = {"opened": 0, "reused": 0, "closed": 0, "requests": 0, "queries": 0, "query_time": 0.0, "held_time": 0.0}
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Kursor liczący zapytania i czas ich wykonania"""
+
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            self.connection.record_query(time.perf_counter() - start)
+
+    def executemany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args, **kwargs)
+        finally:
+            self.connection.record_query(time.perf_counter() - start)
+
+    def executescript(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().executescript(*args, **kwargs)
+        finally:
+            self.connection.record_query(time.perf_counter() - start)
+
+
+class PooledConnection(sqlite3.Connection):
+    """Połączenie z puli, które zapisuje statystyki bieżącego żądania"""
+
+    stats = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def record_query(self, elapsed):
+        if self.stats is not None:
+            self.stats["queries"] += 1
+            self.stats["query_time"] += elapsed
+
+
+def _connect():
+    conn = sqlite3.connect(
+        app.config["DATABASE"],
+        timeout=app.config["DB_BUSY_TIMEOUT"] / 1000,
+        check_same_thread=False,
+        factory=PooledConnection
+    )
+    conn.execute(f"PRAGMA busy_timeout = {int(app.config['DB_BUSY_TIMEOUT'])}")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    with _pool_lock:
+        _pool_stats["opened"] += 1
+    return conn
+
+
+def _checkout():
+    try:
+        conn = _pool.get_nowait()
+        with _pool_lock:
+            _pool_stats["reused"] += 1
+        return conn, False
+    except queue.Empty:
+        return _connect(), True
+
+
+def _release(conn):
+    conn.stats = None
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        conn.close()
+        return
+    if _pool.qsize() < app.config["DB_POOL_SIZE"]:
+        _pool.put(conn)
+    else:
+        conn.close()
+        with _pool_lock:
+            _pool_stats["closed"] += 1
+
+
+def get_db():
+    """Zwraca połączenie przypisane do bieżącego kontekstu aplikacji"""
+    if "db" not in g:
+        conn, opened = _checkout()
+        g.db_stats = {
+            "connections": 1,
+            "opened": int(opened),
+            "queries": 0,
+            "query_time": 0.0,
+            "checked_out": time.perf_counter()
+        }
+        conn.stats = g.db_stats
+        g.db = conn
+    return g.db
+
+
+def db_stats():
+    """Statystyki połączenia dla bieżącego żądania"""
+    if not has_app_context() or "db_stats" not in g:
+        return {"connections": 0, "opened": 0, "queries": 0, "query_time": 0.0, "held_time": 0.0}
+    stats = dict(g.db_stats)
+    stats["held_time"] = time.perf_counter() - stats.pop("checked_out")
+    return stats
+
+
+def pool_stats():
+    """Zbiorcze statystyki puli połączeń"""
+    with _pool_lock:
+        stats = dict(_pool_stats)
+    stats["idle"] = _pool.qsize()
+    return stats
+
+
+@app.after_request
+def add_db_stats_headers(response):
+    if app.config["DB_STATS_HEADERS"]:
+        stats = db_stats()
+        response.headers["X-DB-Connections"] = str(stats["connections"])
+        response.headers["X-DB-Queries"] = str(stats["queries"])
+        response.headers["X-DB-Time"] = f"{stats['held_time'] * 1000:.2f}ms"
+    return response
+
+
+@app.teardown_appcontext
+def close_db(exception=None):
+    conn = g.pop("db", None)
+    if conn is None:
+        return
+    stats = db_stats()
+    g.pop("db_stats", None)
+    with _pool_lock:
+        _pool_stats["requests"] += 1
+        _pool_stats["queries"] += stats["queries"]
+        _pool_stats["query_time"] += stats["query_time"]
+        _pool_stats["held_time"] += stats["held_time"]
+    _release(conn)
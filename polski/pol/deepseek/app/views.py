@@ -1,6 +1,7 @@
 from app import app
-from flask import Flask, redirect, url_for, render_template, request, session, flash, request, abort
+from flask import Flask, redirect, url_for, render_template, request, session, flash, request, abort, jsonify
 import sqlite3
+from app.db import get_db
 import markdown
 import bleach
 import re
@@ -42,7 +43,7 @@ ALLOWED_ATTRIBUTES = {
 }
 
 def init_db():
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users_of_this_app (
@@ -97,12 +98,17 @@ def init_db():
                 FOREIGN KEY (note_id) REFERENCES notes_of_this_app(id) ON DELETE CASCADE
             )
         ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_likes_note_id
+            ON likes_of_this_app (note_id)
+        ''')
         conn.commit()
 
-init_db()
+with app.app_context():
+    init_db()
 def get_note_likes_count(note_id):
     """Pobiera liczbę lajków dla notatki"""
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT COUNT(*) FROM likes_of_this_app WHERE note_id = ?
@@ -111,7 +117,7 @@ def get_note_likes_count(note_id):
 
 def has_user_liked_note(user_id, note_id):
     """Sprawdza czy użytkownik już polubił notatkę"""
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT 1 FROM likes_of_this_app WHERE user_id = ? AND note_id = ?
@@ -121,7 +127,7 @@ def has_user_liked_note(user_id, note_id):
 def add_like_to_db(user_id, note_id):
     """Dodaje lajka do bazy danych"""
     try:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO likes_of_this_app (user_id, note_id)
@@ -139,7 +145,7 @@ def add_like_to_db(user_id, note_id):
 def remove_like_from_db(user_id, note_id):
     """Usuwa lajka z bazy danych"""
     try:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 DELETE FROM likes_of_this_app WHERE user_id = ? AND note_id = ?
@@ -158,14 +164,13 @@ def like_note(note_id):
     if "user" not in session:
         if time.time() - start_time < delay:
             time.sleep(delay - (time.time() - start_time))
-        flash("Musisz być zalogowany, aby lajkować notatki.", "warning")
-        return redirect(url_for("index"))
+        return jsonify({"success": False, "message": "Musisz być zalogowany, aby lajkować notatki."}), 401
     
     username = session["user"]
     ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
     
     # Pobierz ID użytkownika
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id FROM users_of_this_app WHERE username = ?", (username,))
         user = cursor.fetchone()
@@ -173,8 +178,7 @@ def like_note(note_id):
         if not user:
             if time.time() - start_time < delay:
                 time.sleep(delay - (time.time() - start_time))
-            flash("Błąd autoryzacji.", "danger")
-            return redirect(url_for("dashboard"))
+            return jsonify({"success": False, "message": "Błąd autoryzacji."}), 401
         
         user_id = user[0]
         
@@ -183,28 +187,39 @@ def like_note(note_id):
         if not cursor.fetchone():
             if time.time() - start_time < delay:
                 time.sleep(delay - (time.time() - start_time))
-            flash("Notatka nie istnieje.", "danger")
-            return redirect(url_for("dashboard"))
+            return jsonify({"success": False, "message": "Notatka nie istnieje."}), 404
     
-    action = request.form.get("action", "like")
+    data = request.get_json(silent=True) or request.form
+    action = data.get("action", "like")
+    message = None
     
+    # Odpowiedź zawiera tylko stan tej jednej notatki, więc koszt lajka nie zależy od liczby notatek
     if action == "like":
         if add_like_to_db(user_id, note_id):
             log_event("NOTE_LIKED", f"User liked note {note_id}", user_id, ip_address)
-            flash("Polubiono notatkę!", "success")
         else:
-            flash("Już polubiłeś tę notatkę!", "info")
+            message = "Już polubiłeś tę notatkę!"
     elif action == "unlike":
         if remove_like_from_db(user_id, note_id):
             log_event("NOTE_UNLIKED", f"User unliked note {note_id}", user_id, ip_address)
-            flash("Cofnięto like!", "success")
         else:
-            flash("Nie polubiłeś tej notatki!", "info")
+            message = "Nie polubiłeś tej notatki!"
+    else:
+        if time.time() - start_time < delay:
+            time.sleep(delay - (time.time() - start_time))
+        return jsonify({"success": False, "message": "Nieznana akcja."}), 400
+
+    response = {
+        "success": True,
+        "liked": has_user_liked_note(user_id, note_id),
+        "likes": get_note_likes_count(note_id),
+        "message": message
+    }
     
     if time.time() - start_time < delay:
         time.sleep(delay - (time.time() - start_time))
     
-    return redirect(url_for("dashboard"))
+    return jsonify(response), 200
 def generate_key_from_password(password, salt):
     kdf = PBKDF2HMAC(
         algorithm=SHA256(),
@@ -258,7 +273,7 @@ def render():
             log_event("ERROR", "Someone_not_logged", None, ip_address)
             flash("Musisz być zalogowany, aby dodać notatkę.", "danger")
             return redirect(url_for("index"))
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                     SELECT id
@@ -274,7 +289,7 @@ def render():
                 time.sleep(delay-(start_time-time.time()))
             return redirect(url_for("index"))
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT password, private_key, iv, tag, salt FROM users_of_this_app WHERE username = ?", (username,))
             user_data = cursor.fetchone()
@@ -327,7 +342,7 @@ def render():
 
 def add_note_to_db(username, message, signature, ip_address):
     try:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO notes_of_this_app (message, author, signature, ip_address)
@@ -338,7 +353,7 @@ def add_note_to_db(username, message, signature, ip_address):
         raise
     
 def log_event(event_type, event_details=None, user_id=None, ip_address = None):
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO logs_of_this_app (event_type, event_details, user_id, ip_address)
@@ -376,7 +391,7 @@ def index():
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -487,7 +502,7 @@ def verify():
     time_window = 10 * 60
     max_failed_attempts = 3
 
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -666,7 +681,7 @@ def register():
             
 
         try:
-            with sqlite3.connect("users.db") as conn:
+            with get_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -730,7 +745,7 @@ def dashboard():
         username = session['user']
         
         # Pobierz ID aktualnego użytkownika
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id FROM users_of_this_app WHERE username = ?", (username,))
             current_user = cursor.fetchone()
@@ -738,7 +753,7 @@ def dashboard():
 
         notes = []
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -827,7 +842,7 @@ def user_page(user):
     user_ip_address = request.headers.get("X-Forwarded-For", request.headers.get("X-Real-IP", request.remote_addr))
 
     if "user" in session:
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -926,7 +941,7 @@ def change_password():
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -992,7 +1007,7 @@ def change_password():
                     salt = os.urandom(16)
                     change_token = serializer.dumps(email, salt=salt)
                     print("Wysyłam taki token: "+ str(change_token)+" na taki adres "+str(email))
-                    with sqlite3.connect("users.db") as conn:
+                    with get_db() as conn:
                         cursor = conn.cursor()
                         cursor.execute("""
                             UPDATE users_of_this_app 
@@ -1075,7 +1090,7 @@ def change_verify():
     time_window = 10 * 60
     max_failed_attempts = 3
 
-    with sqlite3.connect("users.db") as conn:
+    with get_db() as conn:
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -1171,7 +1186,7 @@ def change_verify():
 
                         hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256:300000', salt_length=16)
 
-                        with sqlite3.connect("users.db") as conn:
+                        with get_db() as conn:
                             cursor = conn.cursor()
                             cursor.execute("""
                                 UPDATE users_of_this_app 
@@ -1235,7 +1250,7 @@ def reset_password():
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -1299,7 +1314,7 @@ def reset_password():
                 salt = os.urandom(16)
                 change_token = serializer.dumps(email, salt=salt)
                 print("Wysyłam taki token: "+ str(change_token)+" na taki adres "+str(email)+" z takim linkiem: /reset_verify/"+str(change_token))
-                with sqlite3.connect("users.db") as conn:
+                with get_db() as conn:
                     cursor = conn.cursor()
                     cursor.execute("""
                             UPDATE users_of_this_app 
@@ -1378,7 +1393,7 @@ def reset_verify(change_token):
         time_window = 10 * 60
         max_failed_attempts = 3
 
-        with sqlite3.connect("users.db") as conn:
+        with get_db() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -1468,7 +1483,7 @@ def reset_verify(change_token):
 
                         hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256:300000', salt_length=16)
 
-                        with sqlite3.connect("users.db") as conn:
+                        with get_db() as conn:
                             cursor = conn.cursor()
                             cursor.execute("""
                                 UPDATE users_of_this_app 